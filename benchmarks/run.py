@@ -0,0 +1,262 @@
+"""
+Headless benchmarks for the page data pipelines.
+
+    python -m benchmarks.run                          # sizes 10,100,1000; profile "fast"
+    python -m benchmarks.run --sizes 100 --profiles none,slow
+    python -m benchmarks.run --replay .data/fixtures  # recorded fixtures instead of synthetic data
+    python -m benchmarks.run --save-baseline          # write benchmarks/baseline.json
+    python -m benchmarks.run --compare                # exit 1 when a stage regressed
+
+Every scenario runs against a fresh, throwaway data dir so cold / warm numbers
+are comparable between runs. The circuit-breaker regression checks
+(check_breakers) run first, and any failure exits 1.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+# must be set before utils is imported: stores are opened at import time
+os.environ.setdefault("DASHBOARD_DATA_DIR", tempfile.mkdtemp(prefix="dashboard-bench-"))
+
+from utils import circuit, llm_cache, news_engine, news_store, ohlcv_store, portfolio_engine, swr  # noqa: E402
+from utils.llm_engine import analyze_theses, analyze_theses_batched  # noqa: E402
+from utils.providers import ReplayProvider, set_provider  # noqa: E402
+from utils.rate_limit import TokenBucket  # noqa: E402
+
+from .synthetic import LATENCY_PROFILES, CallCounter, SyntheticProvider, make_portfolio  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+SHEET_ID = "bench-sheet"
+
+
+class _CountingReplay(ReplayProvider):
+    """Recorded vendor responses; the sheet stays synthetic so --sizes still applies."""
+
+    def __init__(self, fixture_dir, counter: CallCounter, rows: list):
+        super().__init__(fixture_dir, latency=counter.latency)
+        self.counter = counter
+        self.sheet = SyntheticProvider(counter, rows)
+
+    def _replay(self, method, args):
+        self.counter.hit(method)
+        return self.files.load(method, args)
+
+    def sheet_records(self, sheet_id):
+        return self.sheet.sheet_records(sheet_id)
+
+    def sheet_revision(self, sheet_id):
+        return self.sheet.sheet_revision(sheet_id)
+
+
+def _isolate(root: Path):
+    """Point every on-disk / in-process cache at an empty scenario dir."""
+    root.mkdir(parents=True, exist_ok=True)
+    ohlcv_store.DB_PATH = root / "ohlcv.sqlite"
+    llm_cache.DB_PATH = root / "llm_cache.sqlite"
+    news_store.DB_PATH = root / "news.sqlite"
+    swr.clear()
+    circuit.reset()
+    with portfolio_engine._sheet_lock:
+        portfolio_engine._sheet_cache.clear()
+
+
+class _YahooOutage(SyntheticProvider):
+    """Yahoo down the way yfinance reports it: no exception, just an empty frame."""
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        self.counter.hit("download")
+        return pd.DataFrame()
+
+
+class _Unlisted(SyntheticProvider):
+    """Yahoo up, but with no bars for the tickers in `unlisted`."""
+
+    def __init__(self, counter: CallCounter, unlisted):
+        super().__init__(counter)
+        self.unlisted = set(unlisted)
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        return super().download([t for t in tickers if t not in self.unlisted], period, start, interval)
+
+
+def check_breakers(root: Path) -> list:
+    """
+    Regression checks for the bar-store circuit breakers; returns failure messages.
+    An outage must count against Yahoo without opening a breaker for every symbol.
+    A ticker with no bars is remembered only when Yahoo returned bars for others.
+    """
+    failures = []
+    _isolate(root / "outage")
+    set_provider(_YahooOutage(CallCounter({})))
+    ohlcv_store.update(["AAPL", "MSFT"])
+    opened = [b["name"] for b in circuit.status() if b["name"].startswith("symbol:")]
+    if opened:
+        failures.append(f"outage opened symbol breakers: {opened}")
+    if circuit.get("provider:yahoo").failures != 1:
+        failures.append("outage did not count against provider:yahoo")
+
+    _isolate(root / "unlisted")
+    set_provider(_Unlisted(CallCounter({}), ["NOPE"]))
+    ohlcv_store.update(["AAPL", "NOPE"])
+    if circuit.get("symbol:NOPE").state != "open":
+        failures.append("ticker without bars did not open its symbol breaker")
+    if circuit.get("symbol:AAPL").state != "closed" or circuit.get("provider:yahoo").failures:
+        failures.append("ticker without bars counted against AAPL or Yahoo")
+    return failures
+
+
+TRACE_MEMORY = True  # tracemalloc slows allocation-heavy stages; --no-memory turns it off
+
+
+def _stage(results: dict, name: str, counter: CallCounter, fn):
+    before = counter.snapshot()
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    value = fn()
+    wall = time.perf_counter() - t0
+    peak = 0
+    if TRACE_MEMORY:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    after = counter.snapshot()
+    calls = {m: after[m] - before.get(m, 0) for m in after if after[m] != before.get(m, 0)}
+    results[name] = {"wall_s": round(wall, 4), "peak_mb": round(peak / 2**20, 2), "calls": calls}
+    return value
+
+
+def _views(priced):
+    """What the US / IND / News pages do with the shared enriched portfolio."""
+    return {c: portfolio_engine.portfolio_view(priced, country=c) for c in ["US", "IND"]}
+
+
+def _news(tickers):
+    items = news_engine.fetch_portfolio_news(tickers, api_key="bench")
+    for n, category in zip(items, news_engine.classify_headlines([n["headline"] for n in items])):
+        n["category"] = category
+    return items
+
+
+def _llm(df, limit: int, rpm: int, batched: bool = False):
+    positions = [
+        dict(
+            asset=r["asset_name"], ticker=r["ticker"], thesis=r["thesis"], units=r["units"],
+            avg_price=r["avg_price"], price=r["current_price"], high52=r["52w_high"], low52=r["52w_low"],
+        )
+        for r in df.head(limit).to_dict("records")
+    ]
+    fan_out = analyze_theses_batched if batched else analyze_theses
+    return list(fan_out(positions, api_key="bench", rpm=rpm, tpm=rpm * 2000, max_attempts=1))
+
+
+def run_scenario(size: int, profile: str, args) -> dict:
+    counter = CallCounter(LATENCY_PROFILES[profile])
+    rows = make_portfolio(size)
+    provider = _CountingReplay(args.replay, counter, rows) if args.replay else SyntheticProvider(counter, rows)
+    set_provider(provider)
+    _isolate(Path(os.environ["DASHBOARD_DATA_DIR"]) / f"{profile}-{size}")
+
+    results = {}
+    df = _stage(results, "sheet.cold", counter, lambda: portfolio_engine.read_google_sheet(SHEET_ID))
+    _stage(results, "sheet.warm", counter, lambda: portfolio_engine.read_google_sheet(SHEET_ID))
+    priced = _stage(results, "portfolio.cold", counter, lambda: portfolio_engine.calculate_portfolio(df.copy()))
+    _stage(results, "portfolio.warm", counter, lambda: portfolio_engine.calculate_portfolio(df.copy()))
+
+    _stage(results, "views", counter, lambda: _views(priced))
+    _stage(results, "news", counter, lambda: _news(tuple(sorted(df["ticker"].unique()))))
+
+    priced = priced[priced["category"].str.lower() != "crypto"]
+    _stage(results, "llm.cold", counter, lambda: _llm(priced, args.llm_limit, args.llm_rpm))
+    _stage(results, "llm.warm", counter, lambda: _llm(priced, args.llm_limit, args.llm_rpm))
+    _stage(results, "llm.batched", counter, lambda: _llm(priced, args.llm_limit, args.llm_rpm, batched=True))
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Stages whose wall time grew by more than tolerance (fraction) and min_delta seconds."""
+    regressions = []
+    for scenario, stages in current.items():
+        for stage, r in stages.items():
+            base = baseline.get(scenario, {}).get(stage)
+            if base is None:
+                continue
+            delta = r["wall_s"] - base["wall_s"]
+            if delta > min_delta and r["wall_s"] > base["wall_s"] * (1 + tolerance):
+                regressions.append(f"{scenario} {stage}: {base['wall_s']:.3f}s -> {r['wall_s']:.3f}s")
+            elif sum(r["calls"].values()) > sum(base["calls"].values()):
+                regressions.append(f"{scenario} {stage}: calls {base['calls']} -> {r['calls']}")
+    return regressions
+
+
+def _print(scenario: str, stages: dict):
+    print(f"\n== {scenario}")
+    print(f"{'stage':<16}{'wall s':>10}{'peak MB':>10}  calls")
+    for stage, r in stages.items():
+        calls = ", ".join(f"{m}={n}" for m, n in sorted(r["calls"].items())) or "-"
+        print(f"{stage:<16}{r['wall_s']:>10.3f}{r['peak_mb']:>10.2f}  {calls}")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", default="10,100,1000")
+    p.add_argument("--profiles", default="fast", help=f"comma list of {', '.join(LATENCY_PROFILES)}")
+    p.add_argument("--replay", help="fixture dir recorded with DASHBOARD_PROVIDER=record")
+    p.add_argument("--llm-limit", type=int, default=50, help="positions sent through the LLM fan-out")
+    p.add_argument("--llm-rpm", type=int, default=10_000)
+    p.add_argument("--real-limits", action="store_true", help="keep the Finnhub 55/min limiter")
+    p.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no peak_mb)")
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--compare", action="store_true")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    p.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns below this many seconds")
+    p.add_argument("--json", help="also write results to this file")
+    args = p.parse_args(argv)
+
+    global TRACE_MEMORY
+    TRACE_MEMORY = not args.no_memory
+    if not args.real_limits:
+        news_engine._limiter = TokenBucket(rate=10_000, capacity=10_000)
+
+    failures = check_breakers(Path(os.environ["DASHBOARD_DATA_DIR"]) / "checks")
+    for line in failures:
+        print("check failed: " + line)
+    if failures:
+        return 1
+
+    current = {}
+    for profile in args.profiles.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            scenario = f"{profile}/{size}"
+            current[scenario] = run_scenario(size, profile, args)
+            _print(scenario, current[scenario])
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(current, indent=2))
+
+    if args.save_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        baseline.update(current)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"\nbaseline written to {BASELINE_PATH}")
+
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            print("\nno baseline yet (run with --save-baseline)")
+            return 1
+        regressions = compare(current, json.loads(BASELINE_PATH.read_text()), args.tolerance, args.min_delta)
+        print("\nregressions:" if regressions else "\nno regressions")
+        for line in regressions:
+            print("  " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.providers import DataProvider
+
+# Deterministic stand-ins for the vendor APIs and the Google Sheet, with
+# configurable per-call latency and call counting.
+
+LATENCY_PROFILES = {
+    "none": {},
+    "fast": {"download": 0.25, "fast_info": 0.05, "info": 0.4, "company_news": 0.1, "crypto_prices": 0.1, "chat": 0.8, "sheet_records": 0.3, "sheet_revision": 0.05, "weather": 0.2, "unsplash_image": 0.3},
+    "slow": {"download": 1.5, "fast_info": 0.3, "info": 1.5, "company_news": 0.8, "crypto_prices": 0.5, "chat": 4.0, "sheet_records": 1.5, "sheet_revision": 0.2, "weather": 1.0, "unsplash_image": 1.5},
+}
+
+HEADLINE_TEMPLATES = [
+    "{t} beats Q3 earnings estimates as revenue climbs",
+    "{t} announces acquisition of smaller rival in $2B deal",
+    "Regulator opens probe into {t} pricing practices",
+    "{t} unveils new AI chip for data centers",
+    "Fed rate path weighs on {t} and peers",
+    "{t} wins patent appeal in federal court",
+    "Analysts said {t} shares look fully valued after the rally",
+]
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(map(str, parts)).encode())
+
+
+class CallCounter:
+    def __init__(self, latency: dict):
+        self.latency = latency
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, method: str):
+        with self._lock:
+            self.counts[method] += 1
+        delay = self.latency.get(method, 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+class SyntheticProvider(DataProvider):
+    def __init__(self, counter: CallCounter, rows: list = (), news_per_ticker: int = 5):
+        self.counter = counter
+        self.rows = list(rows)
+        self.news_per_ticker = news_per_ticker
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        self.counter.hit("download")
+        end = date.today()
+        begin = date.fromisoformat(start) if start else end - timedelta(days=365)
+        idx = pd.bdate_range(begin, end)
+        frames = {}
+        for t in tickers:
+            rng = np.random.default_rng(_seed(t))
+            # full-year path so incremental downloads line up with the cold one
+            full = pd.bdate_range(end - timedelta(days=365), end)
+            close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(full)))), index=full).reindex(idx).ffill()
+            frames[t] = pd.DataFrame({
+                "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": 1e6,
+            })
+        hist = pd.concat(frames, axis=1)
+        return hist.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+    def fast_info(self, ticker):
+        self.counter.hit("fast_info")
+        return {"lastPrice": 100.0, "yearHigh": 120.0, "yearLow": 80.0, "previousClose": 99.0}
+
+    def info(self, ticker):
+        self.counter.hit("info")
+        return {"regularMarketPrice": 100.0, "fiftyTwoWeekHigh": 120.0, "fiftyTwoWeekLow": 80.0}
+
+    def company_news(self, ticker, date_from, date_to, api_key):
+        self.counter.hit("company_news")
+        now = int(time.time())
+        return [
+            {
+                "headline": HEADLINE_TEMPLATES[(_seed(ticker) + i) % len(HEADLINE_TEMPLATES)].format(t=ticker),
+                "source": ["Reuters", "Yahoo", "SeekingAlpha"][i % 3],
+                "datetime": now - i * 600,
+                "url": f"https://example.com/{ticker}/{i}",
+            }
+            for i in range(self.news_per_ticker)
+        ]
+
+    def crypto_prices(self, params):
+        self.counter.hit("crypto_prices")
+        return {cid: {"usd": 100.0, "inr": 8300.0, "usd_24h_change": 1.0} for cid in params["ids"].split(",")}
+
+    def chat(self, api_key, model, messages, **options):
+        self.counter.hit("chat")
+        if options.get("response_format"):
+            # batched thesis request: one JSON line per position after "POSITIONS:"
+            lines = messages[-1]["content"].split("POSITIONS:\n", 1)[-1].splitlines()
+            return json.dumps({"results": [
+                {"id": pos["id"], "ticker": pos["ticker"], "commentary": "OK", "suggestions": ["none"],
+                 "stance": "HOLD", "stance_reason": "", "signals": ["price"]}
+                for pos in (json.loads(line) for line in lines if line.startswith("{"))
+            ]})
+        return "### Commentary\nOK\n### Suggested changes\n- none\n### Stance\nHOLD\n### Signals to monitor\n- price"
+
+    def sheet_records(self, sheet_id):
+        self.counter.hit("sheet_records")
+        return [dict(r) for r in self.rows]
+
+    def sheet_revision(self, sheet_id):
+        self.counter.hit("sheet_revision")
+        return "2026-01-01T00:00:00.000Z"
+
+    def weather(self, city_id, api_key):
+        self.counter.hit("weather")
+        return {"main": {"temp": 21.5}, "weather": [{"description": "clear sky", "icon": "01d"}]}
+
+    def unsplash_image(self, api_key, collection_id):
+        self.counter.hit("unsplash_image")
+        return {"urls": {"regular": f"https://images.unsplash.com/synthetic-{collection_id}"}}
+
+
+def make_portfolio(n: int) -> list:
+    """n sheet rows: ~45% US, ~45% IND, ~10% crypto."""
+    rows = []
+    for i in range(n):
+        kind = i % 10
+        if kind == 9:
+            rows.append(dict(asset_name=f"Coin {i}", ticker=f"coin{i}", category="Crypto", country="US",
+                             units=1.5, avg_price=100, thesis="Store of value", sector="Crypto"))
+        elif kind % 2:
+            rows.append(dict(asset_name=f"India Co {i}", ticker=f"IN{i}.NS", category="Stock", country="IND",
+                             units=10, avg_price=90, thesis="Domestic growth", sector="Financials"))
+        else:
+            rows.append(dict(asset_name=f"US Co {i}", ticker=f"US{i}", category="Stock", country="US",
+                             units=5, avg_price=95, thesis="Compounder with pricing power", sector="Technology"))
+    return rows
+
@@ -1,37 +1,44 @@
 import streamlit as st
-import requests
-import yfinance as yf
 import pytz
 from datetime import datetime
-import time
+
+from utils import perf, scheduler, swr
+from utils.home_data import load_home_data
 
 # ---------------------------------------------------------
 # PAGE CONFIG
 # ---------------------------------------------------------
 st.set_page_config(page_title="Home", layout="wide")
+perf.begin_run("home")
+
+scheduler.start_scheduler()
 
 # ---------------------------------------------------------
-# BACKGROUND IMAGE FROM UNSPLASH (daily refresh)
+# DATA (image, weather, macro fetched in parallel with deadlines)
 # ---------------------------------------------------------
 UNSPLASH_API_KEY = st.secrets["unsplash"]["api_key"]
+OPENWEATHER_KEY = st.secrets["weather"]["api_key"]
 
-def get_unsplash_image():
-    try:
-        COLLECTION_ID = "1454818"  # Dark minimal curated
-        url = (
-            f"https://api.unsplash.com/photos/random"
-            f"?collections={COLLECTION_ID}"
-            f"&orientation=landscape"
-            f"&content_filter=high"
-            f"&client_id={UNSPLASH_API_KEY}"
-        )
-        r = requests.get(url).json()
-        img = r["urls"]["regular"]
-        return img + f"&t={datetime.now().timestamp()}"
-    except:
-        return "https://images.unsplash.com/photo-1500530855697-b586d89ba3ee?auto=format&fit=crop&w=1920&q=80"
-
-bg_url = get_unsplash_image()
+cities = {
+    "Pune": "1279228",
+    "Mumbai": "1275339",
+    "Ahmedabad": "1279233",
+    "Haldwani": "1270079"
+}
+
+# label (as in macro_engine.INSTRUMENTS) -> logo
+MACROS = {
+    "Nifty 50": "https://upload.wikimedia.org/wikipedia/en/thumb/b/be/Nifty_50_Logo.svg/1200px-Nifty_50_Logo.svg.png",
+    "Nasdaq 100": "https://www.nasdaq.com/sites/acquia.prod/files/2020/09/24/nasdaq.jpg",
+    "Hang Seng": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQondjn-eCA_xCRsB7Tw3D79fmSOoTW-WXmIg&s",
+    "BTC/USD": "https://cryptologos.cc/logos/bitcoin-btc-logo.png",
+    "USD/INR": "https://p7.hiclipart.com/preview/309/810/323/indian-rupee-sign-computer-icons-currency-symbol-icon-design-rupee.jpg",
+    "Gold": "https://png.pngtree.com/png-vector/20200615/ourmid/pngtree-physical-gold-bar-cartoon-golden-vector-png-image_2256034.jpg",
+    "Crude Oil": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ7YJgVc8O5qY-yXfiWBJUtJo0i0Dsf0fARzg&s",
+}
+
+home = load_home_data(UNSPLASH_API_KEY, OPENWEATHER_KEY, cities)
+bg_url = home["image"]
 
 # ---------------------------------------------------------
 # CSS (Neumorphic transparent cards)
@@ -86,31 +93,11 @@ st.markdown(
 # ---------------------------------------------------------
 # WEATHER
 # ---------------------------------------------------------
-OPENWEATHER_KEY = st.secrets["weather"]["api_key"]
-
-cities = {
-    "Pune": "1279228",
-    "Mumbai": "1275339",
-    "Ahmedabad": "1279233",
-    "Haldwani": "1270079"
-}
-
-def get_weather(city_id):
-    try:
-        url = f"https://api.openweathermap.org/data/2.5/weather?id={city_id}&appid={OPENWEATHER_KEY}&units=metric"
-        data = requests.get(url).json()
-        temp = data["main"]["temp"]
-        desc = data["weather"][0]["description"].title()
-        icon = data["weather"][0]["icon"]
-        return temp, desc, f"http://openweathermap.org/img/w/{icon}.png"
-    except:
-        return None, None, None
-
 st.markdown("<h3 style='color:white;'>🌤 Weather</h3>", unsafe_allow_html=True)
 w_cols = st.columns(4)
 
 for i, (city, cid) in enumerate(cities.items()):
-    temp, desc, icon = get_weather(cid)
+    temp, desc, icon = home["weather"][city]
     w_cols[i].markdown(
         f"""
         <div class="weather-card">
@@ -124,67 +111,16 @@ for i, (city, cid) in enumerate(cities.items()):
     )
 
 # ---------------------------------------------------------
-# MACRO INDICATORS
+# MACRO INDICATORS (one shared snapshot, see utils/macro_engine)
 # ---------------------------------------------------------
-MACROS = {
-    "Nifty 50": ("^NSEI", "https://upload.wikimedia.org/wikipedia/en/thumb/b/be/Nifty_50_Logo.svg/1200px-Nifty_50_Logo.svg.png"),
-    "Nasdaq 100": ("^NDX", "https://www.nasdaq.com/sites/acquia.prod/files/2020/09/24/nasdaq.jpg"),
-    "Hang Seng": ("^HSI", "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQondjn-eCA_xCRsB7Tw3D79fmSOoTW-WXmIg&s"),
-    "BTC/USD": ("BTC-USD", "https://cryptologos.cc/logos/bitcoin-btc-logo.png"),
-    "USD/INR": ("USDINR=X", "https://p7.hiclipart.com/preview/309/810/323/indian-rupee-sign-computer-icons-currency-symbol-icon-design-rupee.jpg"),
-    "Gold": ("GOLD_INR", "https://png.pngtree.com/png-vector/20200615/ourmid/pngtree-physical-gold-bar-cartoon-golden-vector-png-image_2256034.jpg"),
-    "Crude Oil": ("CRUDE", "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ7YJgVc8O5qY-yXfiWBJUtJo0i0Dsf0fARzg&s"),
-}
-
-def fetch_macro(ticker):
-    try:
-        # ----- GOLD (Yahoo + INR conversion) -----
-        if ticker == "GOLD_INR":
-            gold = yf.Ticker("GC=F").history(period="5d")
-            if len(gold) < 2:
-                return None, None
-            usd_today = float(gold["Close"].iloc[-1])
-            usd_prev = float(gold["Close"].iloc[-2])
-
-            fx = yf.Ticker("USDINR=X").history(period="2d")
-            usdinr = float(fx["Close"].iloc[-1]) if not fx.empty else 83.0
-
-            inr_per_gram = (usd_today / 31.1035) * usdinr
-            inr_10g = inr_per_gram * 10
-            pct = (usd_today - usd_prev) / usd_prev * 100
-            return inr_10g, pct
-
-        # ----- CRUDE OIL -----
-        if ticker == "CRUDE":
-            crude = yf.Ticker("CL=F").history(period="5d")
-            if len(crude) < 2:
-                return None, None
-            last = float(crude["Close"].iloc[-1])
-            prev = float(crude["Close"].iloc[-2])
-            pct = (last - prev) / prev * 100
-            return last, pct
-
-        # ----- EQUITY / FX -----
-        data = yf.Ticker(ticker).history(period="5d")
-        if len(data) >= 2:
-            last = float(data["Close"].iloc[-1])
-            prev = float(data["Close"].iloc[-2])
-            return last, (last - prev) / prev * 100
-
-        return None, None
-
-    except Exception as e:
-        print("MACRO ERROR:", ticker, e)
-        return None, None
-
-# --------------------------- DISPLAY MACROS ---------------------------
 st.markdown("<h3 style='color:white; margin-top:25px;'>📈 Macro Indicators</h3>", unsafe_allow_html=True)
 m_cols = st.columns(len(MACROS))
 
 macro_snapshot = {}
 
-for i, (label, (ticker, logo)) in enumerate(MACROS.items()):
-    val, pct = fetch_macro(ticker)
+for i, (label, logo) in enumerate(MACROS.items()):
+    d = (home["macro"] or {}).get(label) or {}
+    val, pct = d.get("latest"), d.get("pct_change")
 
     macro_snapshot[label] = {
         "latest": val,
@@ -207,6 +143,8 @@ for i, (label, (ticker, logo)) in enumerate(MACROS.items()):
         unsafe_allow_html=True,
     )
 
+swr.render_stale_notice()
+
 # ---------------------------------------------------------
 # MACRO SUMMARY (NEW)
 # ---------------------------------------------------------
@@ -227,14 +165,16 @@ clean_snapshot = build_clean_macro_snapshot(macro_snapshot)
 # ---------------------------------------------------------
 # LLM MACRO ANALYSIS
 # ---------------------------------------------------------
-from openai import OpenAI
+from utils.llm_engine import stream_completion
 
 def generate_llm_macro_commentary(snapshot):
     """
     snapshot = { 'Nifty 50': {'latest':..., 'pct_change':...}, ... }
+    Yields the commentary markdown as it streams in (cached for an hour once complete).
     """
     if not snapshot:
-        return "Macro data not available today for analysis."
+        yield "Macro data not available today for analysis."
+        return
 
     # Build readable input text
     formatted = []
@@ -262,28 +202,16 @@ Tone: sharp, clear, institutional-grade macro commentary.
 """
 
     try:
-        client = OpenAI(api_key=st.secrets["openai"]["api_key"])
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return resp.choices[0].message.content
+        yield from stream_completion(st.secrets["openai"]["api_key"], "gpt-4o-mini", prompt, ttl=3600)
 
     except Exception as e:
         print("LLM MACRO ERROR:", e)
-        return "⚠️ Macro AI unavailable (rate limit or network issue)."
+        yield "⚠️ Macro AI unavailable (rate limit or network issue)."
 
 
 # Title
 st.markdown("<h3 style='color:white; margin-top:15px;'>🧠 AI Macro Commentary</h3>", unsafe_allow_html=True)
 
-with st.spinner("Generating macro insights…"):
-    @st.cache_data(ttl=3600)
-    def cached_macro_ai(snapshot):
-        return generate_llm_macro_commentary(snapshot)
-
-macro_ai = cached_macro_ai(clean_snapshot)
-
 # -------------------------------
 # AI MACRO COMMENTARY (LEFT ALIGNED, MARKDOWN ENABLED)
 # -------------------------------
@@ -301,8 +229,8 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Render markdown INSIDE the styled card
-st.markdown(macro_ai, unsafe_allow_html=False)
+# Render markdown INSIDE the styled card, streaming as it is generated
+st.write_stream(generate_llm_macro_commentary(clean_snapshot))
 
 st.markdown("</div>", unsafe_allow_html=True)
 
@@ -317,4 +245,4 @@ else:
         direction = "▲" if pct > 0 else "▼" if pct < 0 else "•"
         lines.append(f"**{name}** {direction} {pct:+.2f}%")
 
-    
+perf.render_sidebar_panel()
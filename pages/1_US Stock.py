@@ -1,111 +1,43 @@
-import time
 import streamlit as st
 import pandas as pd
-import numpy as np
-import yfinance as yf
 
-from utils.portfolio_engine import read_google_sheet
-from utils.llm_engine import analyze_thesis
+from utils import perf, portfolio_engine, scheduler, swr
+from utils.llm_engine import analyze_theses, analyze_theses_batched, DEFAULT_RPM, DEFAULT_TPM
 
 
 st.set_page_config(page_title="US Stocks", layout="wide")
+perf.begin_run("us")
 st.title(" US Stock")
 
 
 # ---------------------------------------------------------
-# 1) LOAD & VALIDATE DATA
+# 1) LOAD & VALIDATE DATA (shared enriched portfolio, US view)
 # ---------------------------------------------------------
-df = read_google_sheet(st.secrets["google"]["sheet_id"])
+scheduler.start_scheduler()
+
+try:
+    portfolio = scheduler.precomputed_enriched(st.secrets["google"]["sheet_id"])
+except TimeoutError:
+    st.info("Live prices are still loading. Refresh in a few seconds.")
+    st.stop()
+swr.render_stale_notice()
 
 required = ["asset_name", "ticker", "category", "units", "avg_price", "thesis", "sector", "country"]
-missing = [c for c in required if c not in df.columns]
+missing = [c for c in required if c in portfolio.attrs.get("missing_columns", [])]
 if missing:
     st.error(f"Missing required column(s) in sheet: {', '.join(missing)}")
     st.stop()
 
-df = df.copy()
-df["country"] = df["country"].fillna("").astype(str)
-df["ticker"] = df["ticker"].fillna("").astype(str).str.strip()
-df["asset_name"] = df["asset_name"].fillna("").astype(str)
-df["thesis"] = df["thesis"].fillna("").astype(str)
-df["sector"] = df["sector"].fillna("").astype(str)
-df["category"] = df["category"].fillna("").astype(str)
-
-df = df[df["country"].str.strip().str.lower() == "us"].copy()
-df = df[df["ticker"] != ""].copy()
+# prices, P&L and weight (within this view) come precomputed; see portfolio_engine.calculate_portfolio
+df = portfolio_engine.portfolio_view(portfolio, country="US")
 
 if df.empty:
     st.warning("No US stocks found. Check 'country' == 'US' and tickers are filled.")
     st.stop()
 
-df["units"] = pd.to_numeric(df["units"], errors="coerce").fillna(0.0)
-df["avg_price"] = pd.to_numeric(df["avg_price"], errors="coerce").fillna(0.0)
-
-
-# ---------------------------------------------------------
-# 2) LIVE DATA (YFINANCE) — cached
-# ---------------------------------------------------------
-@st.cache_data(ttl=900, show_spinner=False)
-def get_live_fields(ticker: str):
-    """
-    Returns (current_price, 52w_high, 52w_low) using last 1y of data.
-    """
-    try:
-        hist = yf.Ticker(ticker).history(period="1y")
-        if hist is None or hist.empty:
-            return None, None, None
-        current = float(hist["Close"].iloc[-1])
-        high_52 = float(hist["High"].max())
-        low_52 = float(hist["Low"].min())
-        return current, high_52, low_52
-    except Exception:
-        return None, None, None
-
-
-@st.cache_data(ttl=900, show_spinner=False)
-def get_day_change_pct(ticker: str):
-    """
-    Returns (day_change_pct, last_close, prev_close) based on last 2 daily closes.
-    """
-    try:
-        h = yf.Ticker(ticker).history(period="5d", interval="1d")
-        if h is None or h.empty or len(h) < 2:
-            return None, None, None
-        last = float(h["Close"].iloc[-1])
-        prev = float(h["Close"].iloc[-2])
-        if prev == 0:
-            return None, last, prev
-        pct = (last - prev) / prev * 100
-        return pct, last, prev
-    except Exception:
-        return None, None, None
-
-
-df["current_price"], df["52w_high"], df["52w_low"] = zip(*df["ticker"].apply(get_live_fields))
-df["day_change_pct"], df["last_close"], df["prev_close"] = zip(*df["ticker"].apply(get_day_change_pct))
-
-
-# ---------------------------------------------------------
-# 3) PORTFOLIO METRICS
-# ---------------------------------------------------------
-df["position_invested"] = df["units"] * df["avg_price"]
-df["position_value"] = df["units"] * df["current_price"].fillna(0.0)
-
-df["pnl_absolute"] = df["position_value"] - df["position_invested"]
-df["pnl_pct"] = np.where(
-    df["position_invested"] > 0,
-    (df["pnl_absolute"] / df["position_invested"]) * 100,
-    np.nan,
-)
-
-total_value = float(df["position_value"].sum())
-df["weight_pct"] = np.where(total_value > 0, df["position_value"] / total_value * 100, np.nan)
-
-df.sort_values("position_value", ascending=False, inplace=True)
-
 
 # ---------------------------------------------------------
-# 4) TOP MOVERS
+# 2) TOP MOVERS
 # ---------------------------------------------------------
 st.subheader("⚡ Top Movers (last close vs previous close)")
 
@@ -134,7 +66,7 @@ st.markdown("---")
 
 
 # ---------------------------------------------------------
-# 5) PORTFOLIO TABLE
+# 3) PORTFOLIO TABLE
 # ---------------------------------------------------------
 st.subheader("📊 Current US Equity Portfolio")
 
@@ -198,7 +130,7 @@ st.markdown("---")
 
 
 # ---------------------------------------------------------
-# 6) AI — SINGLE BUTTON ONLY (SESSION STORAGE)
+# 4) AI — SINGLE BUTTON ONLY (SESSION STORAGE)
 # ---------------------------------------------------------
 st.subheader("🤖 AI Thesis Validation")
 
@@ -207,81 +139,73 @@ if "ai_results" not in st.session_state:
 
 OPENAI_KEY = st.secrets["openai"]["api_key"]
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_llm_signal_cached(
-    asset_name: str,
-    ticker: str,
-    thesis: str,
-    units: float,
-    avg_price: float,
-    current_price: float,
-    high_52: float,
-    low_52: float,
-    api_key: str,
-):
-    return analyze_thesis(
-        asset=asset_name,
-        ticker=ticker,
-        thesis=thesis or "",
-        units=float(units),
-        avg_price=float(avg_price),
-        price=float(current_price),
-        high52=float(high_52),
-        low52=float(low_52),
-        api_key=api_key,
-        model="gpt-4o-mini",   # same as Home (more stable than gpt-5 for rate limits)
-    )
-
 run_all = st.button("🚀 Generate AI for ALL (throttled)")
-
-st.caption("Runs sequentially with delays. Results are stored for this session (and cached for 1 hour).")
+batched = st.toggle("Batch positions per request (fewer OpenAI calls; no live streaming)", value=False)
+st.caption("Runs concurrently within your OpenAI rate limits (backs off on 429s). Results are stored for this session.")
 
 if run_all:
     progress = st.progress(0)
     status = st.empty()
+    live = st.empty()  # the completion currently streaming in
 
     rows = df.reset_index(drop=True)
     n = len(rows)
 
-    for i, row in rows.iterrows():
-        ticker = str(row["ticker"])
-        asset = str(row["asset_name"])
-
-        status.write(f"Generating AI: **{asset} ({ticker})**  ({i+1}/{n})")
-
-        cur = row["current_price"]
-        h52 = row["52w_high"]
-        l52 = row["52w_low"]
-
-        if pd.isnull(cur) or pd.isnull(h52) or pd.isnull(l52):
-            st.session_state["ai_results"][ticker] = "⚠️ Live price/52W data missing (yfinance empty)."
-        else:
-            try:
-                md = get_llm_signal_cached(
-                    asset_name=asset,
-                    ticker=ticker,
-                    thesis=str(row.get("thesis", "")),
-                    units=float(row["units"]),
-                    avg_price=float(row["avg_price"]),
-                    current_price=float(cur),
-                    high_52=float(h52),
-                    low_52=float(l52),
-                    api_key=OPENAI_KEY,
-                )
-                st.session_state["ai_results"][ticker] = md
-            except Exception as e:
-                st.session_state["ai_results"][ticker] = f"⚠️ AI call failed (rate limit / network). {e}"
-
-        progress.progress(int((i + 1) / n * 100))
-        time.sleep(1.4)  # throttle (slightly higher to reduce rate-limit bursts)
-
+    has_live = rows[["current_price", "52w_high", "52w_low"]].notnull().all(axis=1)
+    for ticker in rows.loc[~has_live, "ticker"]:
+        st.session_state["ai_results"][str(ticker)] = "⚠️ Live price/52W data missing (yfinance empty)."
+
+    positions = [
+        dict(
+            asset=str(row["asset_name"]),
+            ticker=str(row["ticker"]),
+            thesis=str(row.get("thesis", "")),
+            units=float(row["units"]),
+            avg_price=float(row["avg_price"]),
+            price=float(row["current_price"]),
+            high52=float(row["52w_high"]),
+            low52=float(row["52w_low"]),
+        )
+        for _, row in rows[has_live].iterrows()
+    ]
+
+    done = n - len(positions)
+    openai_cfg = st.secrets["openai"]
+    if batched:
+        results = ((ticker, md, True) for ticker, md in analyze_theses_batched(
+            positions,
+            api_key=openai_cfg["api_key"],
+            model="gpt-4o-mini",
+            batch_size=int(openai_cfg.get("thesis_batch_size", 10)),
+            rpm=int(openai_cfg.get("rpm", DEFAULT_RPM)),
+            tpm=int(openai_cfg.get("tpm", DEFAULT_TPM)),
+        ))
+    else:
+        results = analyze_theses(
+            positions,
+            api_key=OPENAI_KEY,
+            model="gpt-4o-mini",
+            rpm=int(openai_cfg.get("rpm", DEFAULT_RPM)),
+            tpm=int(openai_cfg.get("tpm", DEFAULT_TPM)),
+            stream=True,
+        )
+    for ticker, md, finished in results:
+        if not finished:
+            live.markdown(f"**{ticker}** ✍️\n\n{md}")
+            continue
+        st.session_state["ai_results"][ticker] = md
+        done += 1
+        status.write(f"AI ready: **{ticker}**  ({done}/{n})")
+        progress.progress(int(done / n * 100))
+
+    live.empty()
     status.success("Done. Expand each stock below to view the AI output.")
 
 st.markdown("---")
 
 
 # ---------------------------------------------------------
-# 7) DEEP DIVE PER STOCK (NO PER-STOCK BUTTON)
+# 5) DEEP DIVE PER STOCK (NO PER-STOCK BUTTON)
 # ---------------------------------------------------------
 st.subheader("🔍 Deep Dive: Per Stock")
 
@@ -316,3 +240,5 @@ for _, row in df.reset_index(drop=True).iterrows():
 
 st.markdown("---")
 st.caption("")
+
+perf.render_sidebar_panel()
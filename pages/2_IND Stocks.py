@@ -1,100 +1,42 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import yfinance as yf
-import time
 
-from utils.portfolio_engine import read_google_sheet
-from utils.llm_engine import analyze_thesis
+from utils import perf, portfolio_engine, scheduler, swr
+from utils.llm_engine import analyze_theses, analyze_theses_batched, DEFAULT_RPM, DEFAULT_TPM
 
 st.set_page_config(page_title="India Equities", layout="wide")
+perf.begin_run("ind")
 st.title("Indian Stocks")
 
 # ---------------------------------------------------------
-# 1) LOAD & PREPARE DATA
+# 1) LOAD & PREPARE DATA (shared enriched portfolio, India view)
 # ---------------------------------------------------------
-df = read_google_sheet(st.secrets["google"]["sheet_id"])
+scheduler.start_scheduler()
+
+try:
+    portfolio = scheduler.precomputed_enriched(st.secrets["google"]["sheet_id"])
+except TimeoutError:
+    st.info("Live prices are still loading. Refresh in a few seconds.")
+    st.stop()
+swr.render_stale_notice()
 
 required = ["asset_name", "ticker", "category", "units", "avg_price", "thesis", "sector", "country"]
 for col in required:
-    if col not in df.columns:
+    if col in portfolio.attrs.get("missing_columns", []):
         st.error(f"Missing required column in sheet: '{col}'")
         st.stop()
 
-df["country"] = df["country"].fillna("").astype(str)
-df["ticker"] = df["ticker"].fillna("").astype(str).str.strip()
-df["asset_name"] = df["asset_name"].fillna("").astype(str)
-df["thesis"] = df["thesis"].fillna("").astype(str)
-df["sector"] = df["sector"].fillna("").astype(str)
-df["category"] = df["category"].fillna("").astype(str)
-
-# Filter only Indian equities (Country = IND)
-df = df[df["country"].str.strip().str.upper() == "IND"].copy()
-df = df[df["ticker"] != ""].copy()
+# Filter only Indian equities (Country = IND); prices, P&L (₹, as yfinance quotes
+# Indian stocks in INR) and weight within this view come precomputed
+df = portfolio_engine.portfolio_view(portfolio, country="IND")
 
 if df.empty:
     st.warning("No Indian equities found. Ensure 'country' column is set to 'IND' and tickers are filled.")
     st.caption("For yfinance, Indian tickers usually look like: RELIANCE.NS, TCS.NS, HDFCBANK.NS (or .BO).")
     st.stop()
 
-# Ensure numeric
-df["units"] = pd.to_numeric(df["units"], errors="coerce").fillna(0.0)
-df["avg_price"] = pd.to_numeric(df["avg_price"], errors="coerce").fillna(0.0)
-
-# ---------------------------------------------------------
-# 2) LIVE DATA (YFinance) — cached
-# ---------------------------------------------------------
-@st.cache_data(ttl=900, show_spinner=False)
-def get_live_fields(ticker: str):
-    """Returns (current_price, 52w_high, 52w_low) using last 1y of data."""
-    try:
-        hist = yf.Ticker(ticker).history(period="1y")
-        if hist is None or hist.empty:
-            return None, None, None
-        current = float(hist["Close"].iloc[-1])
-        high_52 = float(hist["High"].max())
-        low_52 = float(hist["Low"].min())
-        return current, high_52, low_52
-    except Exception:
-        return None, None, None
-
-@st.cache_data(ttl=900, show_spinner=False)
-def get_day_change_pct(ticker: str):
-    """Returns (day_change_pct, last_close, prev_close) based on last 2 daily closes (period=5d)."""
-    try:
-        h = yf.Ticker(ticker).history(period="5d", interval="1d")
-        if h is None or h.empty or len(h) < 2:
-            return None, None, None
-        last = float(h["Close"].iloc[-1])
-        prev = float(h["Close"].iloc[-2])
-        if prev == 0:
-            return None, last, prev
-        pct = (last - prev) / prev * 100
-        return pct, last, prev
-    except Exception:
-        return None, None, None
-
-df["current_price"], df["52w_high"], df["52w_low"] = zip(*df["ticker"].apply(get_live_fields))
-df["day_change_pct"], df["last_close"], df["prev_close"] = zip(*df["ticker"].apply(get_day_change_pct))
-
-# Portfolio metrics (₹ assumed since Indian stocks are INR in yfinance)
-df["position_invested"] = df["units"] * df["avg_price"]
-df["position_value"] = df["units"] * df["current_price"].fillna(0.0)
-df["pnl_absolute"] = df["position_value"] - df["position_invested"]
-df["pnl_pct"] = np.where(
-    df["position_invested"] > 0,
-    (df["pnl_absolute"] / df["position_invested"]) * 100,
-    np.nan,
-)
-
-total_value = float(df["position_value"].sum())
-df["weight_pct"] = np.where(total_value > 0, df["position_value"] / total_value * 100, np.nan)
-
-# Sort by current value
-df.sort_values("position_value", ascending=False, inplace=True)
-
 # ---------------------------------------------------------
-# 3) TOP MOVERS TODAY
+# 2) TOP MOVERS TODAY
 # ---------------------------------------------------------
 st.subheader("⚡ Top Movers (last close vs previous close)")
 movers = df[["asset_name", "ticker", "day_change_pct", "last_close", "prev_close"]].copy()
@@ -120,7 +62,7 @@ else:
 st.markdown("---")
 
 # ---------------------------------------------------------
-# 4) PORTFOLIO TABLE
+# 3) PORTFOLIO TABLE
 # ---------------------------------------------------------
 st.subheader("📊 Current Indian Equity Portfolio")
 
@@ -183,85 +125,82 @@ st.dataframe(
 st.markdown("---")
 
 # ---------------------------------------------------------
-# 5) LLM (cached) + SESSION STORAGE
+# 4) SESSION STORAGE
 # ---------------------------------------------------------
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_llm_signal_cached(
-    asset_name: str,
-    ticker: str,
-    thesis: str,
-    units: float,
-    avg_price: float,
-    current_price: float,
-    high_52: float,
-    low_52: float,
-):
-    return analyze_thesis(
-        asset=asset_name,
-        ticker=ticker,
-        thesis=thesis or "",
-        units=float(units),
-        avg_price=float(avg_price),
-        price=float(current_price),
-        high52=float(high_52),
-        low52=float(low_52),
-    )
-
 if "ai_results_ind" not in st.session_state:
     st.session_state["ai_results_ind"] = {}  # key: ticker -> markdown
 
 # ---------------------------------------------------------
-# 6) GENERATE AI FOR ALL (throttled) — single button only
+# 5) GENERATE AI FOR ALL (rate-governed) — single button only
 # ---------------------------------------------------------
 st.subheader("🤖 AI Thesis Validation (All Indian Equities)")
 
 run_all = st.button("🚀 Generate AI for ALL (throttled)")
-st.caption("Runs sequentially with a short delay to reduce rate-limits. Results persist during your session.")
+batched = st.toggle("Batch positions per request (fewer OpenAI calls; no live streaming)", value=False)
+st.caption("Runs concurrently within your OpenAI rate limits (backs off on 429s). Results persist during your session.")
 
 if run_all:
     progress = st.progress(0)
     status = st.empty()
+    live = st.empty()  # the completion currently streaming in
 
     rows = df.reset_index(drop=True)
     n = len(rows)
 
-    for i, row in rows.iterrows():
-        ticker = str(row["ticker"])
-        asset = str(row["asset_name"])
-
-        status.write(f"Generating AI: **{asset} ({ticker})**  ({i+1}/{n})")
-
-        cur = row["current_price"]
-        h52 = row["52w_high"]
-        l52 = row["52w_low"]
-
-        if pd.isnull(cur) or pd.isnull(h52) or pd.isnull(l52):
-            st.session_state["ai_results_ind"][ticker] = "⚠️ Live price/52W data missing (yfinance empty)."
-        else:
-            try:
-                md = get_llm_signal_cached(
-                    asset_name=asset,
-                    ticker=ticker,
-                    thesis=str(row.get("thesis", "")),
-                    units=float(row["units"]),
-                    avg_price=float(row["avg_price"]),
-                    current_price=float(cur),
-                    high_52=float(h52),
-                    low_52=float(l52),
-                )
-                st.session_state["ai_results_ind"][ticker] = md
-            except Exception:
-                st.session_state["ai_results_ind"][ticker] = "⚠️ AI call failed (rate limit / network). Try again later."
-
-        progress.progress(int((i + 1) / n * 100))
-        time.sleep(1.2)
-
+    has_live = rows[["current_price", "52w_high", "52w_low"]].notnull().all(axis=1)
+    for ticker in rows.loc[~has_live, "ticker"]:
+        st.session_state["ai_results_ind"][str(ticker)] = "⚠️ Live price/52W data missing (yfinance empty)."
+
+    positions = [
+        dict(
+            asset=str(row["asset_name"]),
+            ticker=str(row["ticker"]),
+            thesis=str(row.get("thesis", "")),
+            units=float(row["units"]),
+            avg_price=float(row["avg_price"]),
+            price=float(row["current_price"]),
+            high52=float(row["52w_high"]),
+            low52=float(row["52w_low"]),
+        )
+        for _, row in rows[has_live].iterrows()
+    ]
+
+    done = n - len(positions)
+    openai_cfg = st.secrets["openai"]
+    if batched:
+        results = ((ticker, md, True) for ticker, md in analyze_theses_batched(
+            positions,
+            api_key=openai_cfg["api_key"],
+            model="gpt-4o-mini",
+            batch_size=int(openai_cfg.get("thesis_batch_size", 10)),
+            rpm=int(openai_cfg.get("rpm", DEFAULT_RPM)),
+            tpm=int(openai_cfg.get("tpm", DEFAULT_TPM)),
+        ))
+    else:
+        results = analyze_theses(
+            positions,
+            api_key=openai_cfg["api_key"],
+            model="gpt-4o-mini",
+            rpm=int(openai_cfg.get("rpm", DEFAULT_RPM)),
+            tpm=int(openai_cfg.get("tpm", DEFAULT_TPM)),
+            stream=True,
+        )
+    for ticker, md, finished in results:
+        if not finished:
+            live.markdown(f"**{ticker}** ✍️\n\n{md}")
+            continue
+        st.session_state["ai_results_ind"][ticker] = md
+        done += 1
+        status.write(f"AI ready: **{ticker}**  ({done}/{n})")
+        progress.progress(int(done / n * 100))
+
+    live.empty()
     status.success("Done. Expand each stock below to view the AI output.")
 
 st.markdown("---")
 
 # ---------------------------------------------------------
-# 7) DEEP DIVE PER STOCK (no per-stock button)
+# 6) DEEP DIVE PER STOCK (no per-stock button)
 # ---------------------------------------------------------
 st.subheader("🔍 Deep Dive: Per Stock")
 
@@ -296,3 +235,5 @@ for _, row in df.reset_index(drop=True).iterrows():
 
 st.markdown("---")
 st.caption("")
+
+perf.render_sidebar_panel()
@@ -1,17 +1,23 @@
+import json
+import re
 import streamlit as st
 from datetime import datetime, timezone
 import time
 
-from utils.portfolio_engine import read_google_sheet
-from utils.news_engine import fetch_news_finnhub
-from openai import OpenAI
+from utils import perf, scheduler
+from utils.news_engine import DEFAULT_WINDOW_DAYS, classify_headlines, get_classifier
+from utils import circuit, llm_cache, news_store, portfolio_engine
+from utils.llm_engine import JSON_FORMAT, stream_completion
 
 # ---------------------------------------------------------
 # PAGE CONFIG
 # ---------------------------------------------------------
 st.set_page_config(page_title="News", layout="wide")
+perf.begin_run("news")
 st.title("📰 Portfolio News — Key Headlines")
 
+scheduler.start_scheduler()
+
 # ---------------------------------------------------------
 # HELPERS
 # ---------------------------------------------------------
@@ -24,98 +30,54 @@ def _safe_ts(ts: int | float | None) -> str:
     except Exception:
         return ""
 
-def classify_headline(headline: str) -> str:
-    """
-    Simple keyword classifier for filtering.
-    """
-    h = (headline or "").lower()
-
-    earnings_kw = ["earnings", "eps", "revenue", "guidance", "q1", "q2", "q3", "q4", "quarter", "results", "profit", "margin"]
-    ma_kw = ["acquire", "acquisition", "merger", "buyout", "takeover", "deal", "stake", "invests in", "to buy", "sale"]
-    reg_kw = ["regulator", "sec", "antitrust", "doj", "probe", "lawsuit", "ban", "sanction", "compliance", "fine", "policy", "tariff"]
-    product_kw = ["launch", "unveil", "release", "product", "chip", "ai", "model", "vehicle", "ev", "software", "update", "partnership"]
-    macro_kw = ["fed", "inflation", "rates", "yield", "oil", "gold", "dollar", "usd", "rupee", "macro", "economy", "recession", "cpi", "jobs"]
-    legal_kw = ["court", "lawsuit", "settlement", "appeal", "injunction", "patent", "ip", "litigation"]
-
-    def contains_any(words):
-        return any(w in h for w in words)
-
-    if contains_any(earnings_kw): return "Earnings"
-    if contains_any(ma_kw):       return "M&A"
-    if contains_any(reg_kw):      return "Regulation"
-    if contains_any(product_kw):  return "Product"
-    if contains_any(macro_kw):    return "Macro"
-    if contains_any(legal_kw):    return "Legal"
-    return "Other"
-
-
-@st.cache_data(ttl=1800, show_spinner=False)
 def load_portfolio(sheet_id: str):
-    df = read_google_sheet(sheet_id)
-    # Normalize columns we need
+    """The shared enriched portfolio (the plain typed sheet while prices are still loading)."""
+    try:
+        df = scheduler.precomputed_enriched(sheet_id)
+    except TimeoutError:
+        df = scheduler.precomputed_portfolio(sheet_id)
     if "ticker" not in df.columns:
         return None
-    if "country" not in df.columns:
-        df["country"] = ""
-    if "asset_name" not in df.columns:
-        df["asset_name"] = ""
+    for col in ["country", "asset_name"]:
+        if col not in df.columns:
+            df[col] = ""
+    return portfolio_engine.portfolio_view(df)
 
-    df["ticker"] = df["ticker"].fillna("").astype(str).str.strip()
-    df["country"] = df["country"].fillna("").astype(str).str.strip().str.upper()
-    df["asset_name"] = df["asset_name"].fillna("").astype(str).str.strip()
 
-    df = df[df["ticker"] != ""].copy()
-    return df
-
-
-@st.cache_data(ttl=1200, show_spinner=False)
-def fetch_portfolio_news(tickers: tuple[str, ...]):
+@perf.timed("page.news.feed", cache=True)
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_portfolio_news(tickers: tuple[str, ...], days: int):
     """
-    Fetch per-ticker news, aggregate and dedupe.
-    Returns list[dict] with keys: headline, source, datetime, url, ticker
+    Portfolio news from the last `days` days (deduped, most recent first), read from
+    the local news store that the background scheduler keeps up to date.
+    Returns list[dict] with keys: headline, source, datetime, url, ticker, tickers, sources, duplicates
     """
-    all_news = []
-    seen = set()
+    perf.miss()
+    return scheduler.precomputed_news(tickers, days)
 
-    for tkr in tickers:
-        try:
-            items = fetch_news_finnhub(tkr) or []
-        except Exception:
-            items = []
-
-        for n in items:
-            headline = (n.get("headline") or "").strip()
-            url = (n.get("url") or "").strip()
-            if not headline:
-                continue
-
-            # dedupe on headline (and url if present)
-            key = (headline.lower(), url)
-            if key in seen:
-                continue
-            seen.add(key)
-
-            all_news.append({
-                "headline": headline,
-                "source": (n.get("source") or "").strip(),
-                "datetime": n.get("datetime", 0),
-                "url": url,
-                "ticker": tkr
-            })
-
-    # sort most recent
-    all_news.sort(key=lambda x: x.get("datetime", 0), reverse=True)
-    return all_news
-
-
-@st.cache_data(ttl=3600, show_spinner=False)
-def ai_rank_and_summarize(headlines_block: str, api_key: str) -> dict:
+
+_SUMMARY_SO_FAR = re.compile(r'"summary"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
+def _partial_summary(txt: str) -> str:
+    """The (possibly unfinished) "summary" string of a JSON response still streaming in."""
+    m = _SUMMARY_SO_FAR.search(txt)
+    if not m:
+        return ""
+    try:
+        return json.loads('"' + m.group(1).rstrip("\\") + '"')
+    except ValueError:
+        return m.group(1)
+
+
+@perf.timed("page.news.ai_brief")
+def ai_rank_and_summarize(headlines_block: str, api_key: str, on_summary=None) -> dict:
     """
     LLM: pick most impactful + summary + what to watch
     Returns dict with keys: summary, impactful (list of strings), watch (list of strings)
+    The response streams in; on_summary(text) gets the summary so far as it grows.
+    Responses are cached for 1 hour (utils/llm_cache).
     """
-    client = OpenAI(api_key=api_key)
-
     prompt = f"""
 You are a buy-side equity + macro analyst writing a tight morning news brief for a portfolio manager.
 
@@ -137,19 +99,27 @@ HEADLINES:
     # retry to reduce rate-limit failures
     for _ in range(3):
         try:
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            txt = resp.choices[0].message.content.strip()
+            txt = ""
+            for delta in stream_completion(api_key, "gpt-4o-mini", prompt, ttl=3600, response_format=JSON_FORMAT):
+                txt += delta
+                if on_summary is not None:
+                    on_summary(_partial_summary(txt))
+            txt = txt.strip()
 
             # very lightweight JSON extraction (avoid extra deps)
             # If model returns fenced JSON, strip fences.
             if txt.startswith("```"):
                 txt = txt.replace("```json", "").replace("```", "").strip()
 
-            import json
-            return json.loads(txt)
+            try:
+                return json.loads(txt)
+            except ValueError:
+                # don't keep serving a response we can't parse
+                llm_cache.invalidate("gpt-4o-mini", prompt, response_format=JSON_FORMAT)
+                raise
+
+        except circuit.CircuitOpen:
+            break  # OpenAI is failing: don't retry until its breaker closes
 
         except Exception:
             time.sleep(1.5)
@@ -169,13 +139,13 @@ if df is None or df.empty:
     st.warning("No portfolio tickers found. Ensure your sheet has a 'ticker' column filled.")
     st.stop()
 
-# Country sets (expects US / IND)
-us_df = df[df["country"].isin(["US", "USA"])].copy()
-ind_df = df[df["country"].isin(["IND", "IN", "INDIA"])].copy()
+# Country sets (expects US / IND, see portfolio_engine.COUNTRY_ALIASES)
+us_df = portfolio_engine.portfolio_view(df, country="US")
+ind_df = portfolio_engine.portfolio_view(df, country="IND")
 
 tab_all, tab_us, tab_ind = st.tabs(["All", "US", "India"])
 
-filters = ["Earnings", "M&A", "Regulation", "Product", "Macro", "Legal", "Other"]
+filters = get_classifier().labels
 
 with st.sidebar:
     st.subheader("Filters")
@@ -185,6 +155,7 @@ with st.sidebar:
         default=filters,
     )
     max_headlines = st.slider("Max headlines", 5, 50, 20, 5)
+    window_days = st.slider("Window (days)", 1, news_store.RETENTION_DAYS, DEFAULT_WINDOW_DAYS)
 
     st.divider()
     st.subheader("AI Brief")
@@ -198,16 +169,17 @@ def render_news(feed_df, label: str):
         return
 
     with st.spinner("Fetching news…"):
-        news = fetch_portfolio_news(tickers)
+        news = fetch_portfolio_news(tickers, window_days)
 
     if not news:
-        st.info("No major portfolio-linked news found (last 24–48 hours).")
+        st.info(f"No major portfolio-linked news found (last {window_days} day(s)).")
         return
 
     # attach category + map to portfolio asset name
     tkr_to_name = dict(zip(feed_df["ticker"], feed_df["asset_name"]))
-    for n in news:
-        n["category"] = classify_headline(n["headline"])
+    categories = classify_headlines([n["headline"] for n in news])
+    for n, category in zip(news, categories):
+        n["category"] = category
         n["asset_name"] = tkr_to_name.get(n["ticker"], n["ticker"])
 
     # filter
@@ -226,7 +198,6 @@ def render_news(feed_df, label: str):
     if run_ai:
         # feed up to 40 lines to AI for ranking; still show only max_headlines
         ai_input = "\n".join([f"- {n['headline']}" for n in news[:40]])
-        ai = ai_rank_and_summarize(ai_input, st.secrets["openai"]["api_key"])
 
         # Beautiful “brief” card
         st.markdown(
@@ -246,7 +217,13 @@ def render_news(feed_df, label: str):
         )
 
         st.markdown("### 🧠 AI Brief")
-        st.markdown(f"<div class='brief-card'>{ai.get('summary','')}</div>", unsafe_allow_html=True)
+        card = st.empty()
+
+        def show_summary(text):
+            card.markdown(f"<div class='brief-card'>{text}</div>", unsafe_allow_html=True)
+
+        ai = ai_rank_and_summarize(ai_input, st.secrets["openai"]["api_key"], on_summary=show_summary)
+        show_summary(ai.get("summary", ""))
 
         impactful = ai.get("impactful") or []
         watch = ai.get("watch") or []
@@ -281,12 +258,15 @@ def render_news(feed_df, label: str):
         src = n.get("source", "")
         cat = n.get("category", "Other")
         url = n.get("url", "")
-        holding = n.get("asset_name", n.get("ticker", ""))
+        linked = n.get("tickers") or [n["ticker"]]
+        holding = ", ".join(f"{tkr_to_name.get(t, t)} ({t})" for t in linked)
+        if n.get("duplicates"):
+            src = f"{', '.join(n.get('sources') or [src])} · +{n['duplicates']} similar"
 
         st.markdown(
             f"""
 **{i}. {n['headline']}**  
-<small>{src} · {ts} · <b>{cat}</b> · <i>{holding} ({n['ticker']})</i></small>  
+<small>{src} · {ts} · <b>{cat}</b> · <i>{holding}</i></small>  
 {f"[Read more]({url})" if url else ""}
 """,
             unsafe_allow_html=True
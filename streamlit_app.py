@@ -1,9 +1,13 @@
 import streamlit as st
 
+from utils import scheduler
+
+scheduler.start_scheduler()
+
 st.title("📊 Suwarn’s Investment Intelligence Dashboard")
 st.write("A multipage, AI-powered portfolio intelligence system.")
 
 st.header("Navigation")
 st.write("Use the left sidebar to access pages: Portfolio, Assets, News, Macro, Signals.")
 
-st.success("Auto refresh every 15 minutes is enabled on relevant pages.")
+st.success("Market, macro and news data refresh in the background; pages read the latest snapshot.")
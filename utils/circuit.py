@@ -0,0 +1,134 @@
+import threading
+import time
+
+# Failure tracking shared by every page and session: one circuit breaker per
+# symbol ("symbol:TSLA") and per provider ("provider:yahoo", "provider:openai"):
+#
+#     breaker = circuit.get("provider:openai")
+#     if not breaker.allow():
+#         raise circuit.CircuitOpen(breaker)
+#     try:
+#         ...
+#     except Exception as e:
+#         breaker.failure(e)
+#         raise
+#     breaker.success()
+#
+# After `threshold` consecutive failures the breaker opens and calls are
+# short-circuited for a cooldown. Then a single probe call is let through
+# (half-open) while everyone else is still turned away: its success closes the
+# breaker, its failure reopens it with the cooldown doubled, up to max_cooldown.
+# A caller that gets allow() == True must end with success(), failure() or, when
+# the outcome says nothing about the dependency (e.g. a 429), release().
+# Symbol breakers open on the first "no such ticker / no data" answer, so a bad
+# symbol is a remembered negative result instead of a fetch on every rerun.
+
+PROBE_TIMEOUT = 60  # seconds before an unanswered probe is presumed lost and another is let through
+
+POLICIES = {
+    "symbol": {"threshold": 1, "cooldown": 900, "max_cooldown": 86400},
+    "provider": {"threshold": 3, "cooldown": 30, "max_cooldown": 600},
+}
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        super().__init__(f"{breaker.name} unavailable (last error: {breaker.last_error}), retrying in {breaker.retry_in():.0f}s")
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, threshold: int, cooldown: float, max_cooldown: float):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0        # consecutive
+        self.trips = 0           # consecutive openings (cooldown doubles each time)
+        self.open_until = 0.0
+        self.probing = False     # half-open: one call is out testing the dependency
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True when closed; once the cooldown has passed, True for a single probe caller."""
+        with self._lock:
+            if self.failures < self.threshold:
+                return True
+            now = time.monotonic()
+            if now < self.open_until:
+                return False
+            # the cooldown is over (or the last probe never reported back)
+            self.probing = True
+            self.open_until = now + PROBE_TIMEOUT
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            self.probing = False
+            self.last_error = None
+
+    def release(self):
+        """End an allowed call without a verdict, so the next caller may probe at once."""
+        with self._lock:
+            if self.probing:
+                self.probing = False
+                self.open_until = time.monotonic()
+
+    def failure(self, error=None):
+        """Count one failure (an exception, or a short reason such as a QuoteError value)."""
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            self.last_error = error if isinstance(error, str) else type(error).__name__ if error else "error"
+            if self.failures >= self.threshold:
+                self.open_until = time.monotonic() + min(self.max_cooldown, self.cooldown * 2 ** self.trips)
+                self.trips += 1
+
+    def retry_in(self) -> float:
+        """Seconds until calls are let through again (0 when not open)."""
+        with self._lock:
+            if self.failures < self.threshold:
+                return 0.0
+            return max(0.0, self.open_until - time.monotonic())
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.threshold:
+            return "closed"
+        return "half-open" if self.probing or self.retry_in() == 0 else "open"
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get(name: str) -> CircuitBreaker:
+    """The process-wide breaker for "symbol:..." or "provider:..." (created on first use)."""
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            policy = POLICIES.get(name.split(":", 1)[0], POLICIES["provider"])
+            breaker = _breakers[name] = CircuitBreaker(name, **policy)
+        return breaker
+
+
+def status() -> list:
+    """[{name, state, failures, retry_in_s, last_error}] for every breaker that isn't closed."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return [
+        {"name": b.name, "state": b.state, "failures": b.failures, "retry_in_s": round(b.retry_in()), "last_error": b.last_error}
+        for b in breakers
+        if b.state != "closed"
+    ]
+
+
+def reset():
+    """Forget every breaker (e.g. between benchmark scenarios)."""
+    with _lock:
+        _breakers.clear()
@@ -0,0 +1,31 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# SQLite files behind the on-disk stores (see paths.data_path). Each store
+# passes its schema setup, which runs once per database path and process, so
+# later connections only pay for the open.
+
+_ready = set()
+_lock = threading.Lock()
+
+
+@contextmanager
+def connect(path, setup):
+    """
+    Connection for one unit of work: committed (or rolled back) and closed on exit.
+    setup(conn) creates the store's tables the first time `path` is opened.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        key = str(path)
+        if key not in _ready:
+            with _lock:
+                if key not in _ready:
+                    with conn:
+                        setup(conn)
+                    _ready.add(key)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
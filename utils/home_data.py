@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from . import perf, swr
+from .providers import get_provider
+from .scheduler import precomputed_macro
+
+# Home page widgets are fetched in parallel; each source gets its own deadline
+# and falls back to the last good value (or a placeholder) instead of holding
+# up the page. Expired values are refreshed in the background (see utils/swr).
+
+DEADLINES = {"image": 3.0, "weather": 4.0, "macro": 10.0}
+FALLBACK_IMAGE = "https://images.unsplash.com/photo-1500530855697-b586d89ba3ee?auto=format&fit=crop&w=1920&q=80"
+UNSPLASH_COLLECTION_ID = "1454818"  # Dark minimal curated
+
+# shared pool: a fetch that misses its deadline keeps running and warms the cache
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="home-data")
+
+
+@swr.cached("home.image", ttl=86400, deadline=DEADLINES["image"], fallback=FALLBACK_IMAGE)
+def get_background_image(api_key: str) -> str:
+    """One random Unsplash image per day."""
+    return get_provider().unsplash_image(api_key, UNSPLASH_COLLECTION_ID)["urls"]["regular"]
+
+
+@swr.cached("home.weather", ttl=1800, deadline=DEADLINES["weather"], fallback=(None, None, None))
+def get_weather(city_id: str, api_key: str):
+    """Returns (temp_c, description, icon_url) for an OpenWeather city id."""
+    data = get_provider().weather(city_id, api_key)
+    temp = data["main"]["temp"]
+    desc = data["weather"][0]["description"].title()
+    icon = data["weather"][0]["icon"]
+    return temp, desc, f"http://openweathermap.org/img/w/{icon}.png"
+
+
+def _result(fut, deadline_at: float, fallback):
+    try:
+        return fut.result(timeout=max(0.0, deadline_at - time.monotonic()))
+    except TimeoutError:
+        return fallback
+    except Exception:
+        return fallback
+
+
+@perf.timed("home.load")
+def load_home_data(unsplash_key: str, weather_key: str, city_ids: dict) -> dict:
+    """
+    Fetch background image, weather for every city and the macro snapshot in parallel.
+    Returns dict with keys: image (url), weather ({city: (temp, desc, icon)}), macro (macro_engine snapshot or None).
+    """
+    start = time.monotonic()
+
+    image_f = _pool.submit(perf.propagate(get_background_image), unsplash_key)
+    weather_f = {city: _pool.submit(perf.propagate(get_weather), cid, weather_key) for city, cid in city_ids.items()}
+    macro_f = _pool.submit(perf.propagate(precomputed_macro))
+
+    return {
+        "image": _result(image_f, start + DEADLINES["image"], FALLBACK_IMAGE),
+        "weather": {
+            city: _result(f, start + DEADLINES["weather"], (None, None, None))
+            for city, f in weather_f.items()
+        },
+        "macro": _result(macro_f, start + DEADLINES["macro"], None),
+    }
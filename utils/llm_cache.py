@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+import time
+
+from . import db
+from .paths import data_path
+
+# Durable LLM response cache shared by every session and surviving restarts.
+# Entries are keyed by a hash of (model, prompt, options), expire after their own
+# TTL and are evicted least-recently-used once the file grows past MAX_BYTES.
+
+DB_PATH = data_path("llm_cache.sqlite")
+DEFAULT_TTL = 3600
+MAX_BYTES = 50 * 1024 * 1024
+
+_write_lock = threading.Lock()
+
+
+def _schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key      TEXT PRIMARY KEY,
+            model    TEXT,
+            value    TEXT NOT NULL,
+            size     INTEGER NOT NULL,
+            created  REAL NOT NULL,
+            expires  REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+
+def _connect():
+    return db.connect(DB_PATH, _schema)
+
+
+def make_key(model: str, prompt: str, **options) -> str:
+    raw = json.dumps([model, prompt, options], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(model: str, prompt: str, **options):
+    """Cached response text, or None when missing / expired."""
+    key = make_key(model, prompt, **options)
+    now = time.time()
+    with _write_lock, _connect() as conn:
+        row = conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+    return row[0]
+
+
+def put(model: str, prompt: str, value: str, ttl: float = DEFAULT_TTL, **options):
+    key = make_key(model, prompt, **options)
+    now = time.time()
+    size = len(value.encode("utf-8"))
+    with _write_lock, _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model, value, size, now, now + ttl, now),
+        )
+        _evict(conn, now)
+
+
+def invalidate(model: str, prompt: str, **options):
+    key = make_key(model, prompt, **options)
+    with _write_lock, _connect() as conn:
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+
+def _evict(conn, now: float):
+    conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    # drop least-recently-used entries until we are back under the cap
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        if total <= MAX_BYTES:
+            break
@@ -1,8 +1,106 @@
+import json
+import queue
+import threading
 import time
-from openai import OpenAI
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 
+from openai import RateLimitError
 
-def analyze_thesis(
+from . import circuit, llm_cache, perf
+from .providers import get_provider
+from .rate_limit import TokenBucket
+
+# Default OpenAI quota for the pipeline (override per call / via secrets).
+DEFAULT_RPM = 60
+DEFAULT_TPM = 150_000
+MAX_CONCURRENCY = 8
+STREAM_UPDATE_INTERVAL = 0.25  # seconds between partial-text updates in streaming mode
+JSON_FORMAT = {"type": "json_object"}  # OpenAI JSON mode
+
+
+def _openai_breaker():
+    # rate limits are handled by backoff / AdaptiveLimiter and never trip it
+    return circuit.get("provider:openai")
+
+
+def _guarded(call):
+    """call() behind the OpenAI breaker; raises circuit.CircuitOpen while it is open."""
+    breaker = _openai_breaker()
+    if not breaker.allow():
+        raise circuit.CircuitOpen(breaker)
+    try:
+        result = call()
+    except RateLimitError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.failure(e)
+        raise
+    breaker.success()
+    return result
+
+
+def cached_completion(api_key: str, model: str, prompt: str, ttl: float = llm_cache.DEFAULT_TTL, **options) -> str:
+    """
+    Single-message chat completion (via the active provider) through the persistent
+    LLM cache. Only successful responses are stored. Extra options (e.g.
+    response_format) go to the API and are part of the cache key.
+    Raises circuit.CircuitOpen without calling the API while OpenAI is failing.
+    """
+    with perf.span("llm.completion", cache="hit"):
+        hit = llm_cache.get(model, prompt, **options)
+        if hit is not None:
+            return hit
+
+        perf.miss()
+        text = _guarded(lambda: get_provider().chat(api_key, model, [{"role": "user", "content": prompt}], **options))
+        llm_cache.put(model, prompt, text, ttl, **options)
+        return text
+
+
+def stream_completion(api_key: str, model: str, prompt: str, ttl: float = llm_cache.DEFAULT_TTL, **options):
+    """
+    Streaming cached_completion: yields text deltas as they arrive (a cache hit
+    yields the whole text at once). The full text is cached only if the stream
+    completes; errors propagate to the consumer.
+    Works with st.write_stream.
+    """
+    t0 = time.perf_counter()
+    hit = llm_cache.get(model, prompt, **options)
+    if hit is not None:
+        perf.record("llm.stream", time.perf_counter() - t0, cache="hit")
+        yield hit
+        return
+
+    breaker = _openai_breaker()
+    if not breaker.allow():
+        perf.record("llm.stream", time.perf_counter() - t0, cache="miss", breaker=breaker.name)
+        raise circuit.CircuitOpen(breaker)
+
+    parts = []
+    first = None
+    try:
+        for delta in get_provider().chat_stream(api_key, model, [{"role": "user", "content": prompt}], **options):
+            if first is None:
+                first = time.perf_counter() - t0
+            parts.append(delta)
+            yield delta
+    except GeneratorExit:
+        breaker.release()  # the consumer stopped reading; no verdict on OpenAI
+        raise
+    except Exception as e:
+        perf.record("llm.stream", time.perf_counter() - t0, cache="miss", error=type(e).__name__)
+        if isinstance(e, RateLimitError):
+            breaker.release()
+        else:
+            breaker.failure(e)
+        raise
+    breaker.success()
+    perf.record("llm.stream", time.perf_counter() - t0, cache="miss", first_token_s=first)
+    llm_cache.put(model, prompt, "".join(parts), ttl, **options)
+
+
+def build_thesis_prompt(
     asset: str,
     ticker: str,
     thesis: str,
@@ -11,15 +109,7 @@ def analyze_thesis(
     price: float,
     high52: float,
     low52: float,
-    api_key: str,
-    model: str = "gpt-4o-mini",
 ) -> str:
-    """
-    Calls OpenAI to evaluate your thesis.
-    Returns markdown string.
-    NOTE: Keep this function NON-cached; cache it at the page level.
-    """
-
     thesis = (thesis or "").strip() or "No thesis provided."
 
     prompt = f"""
@@ -60,21 +150,401 @@ Return ONLY clean markdown with these headings:
 ### Signals to monitor
 """.strip()
 
-    client = OpenAI(api_key=api_key)
+    return prompt
+
+
+@perf.timed("llm.analyze_thesis", cache=True)
+def analyze_thesis(
+    asset: str,
+    ticker: str,
+    thesis: str,
+    units: float,
+    avg_price: float,
+    price: float,
+    high52: float,
+    low52: float,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+) -> str:
+    """
+    Calls OpenAI to evaluate your thesis.
+    Returns markdown string.
+    Responses are cached on disk (utils/llm_cache), so repeated prompts skip the API.
+    """
+    prompt = build_thesis_prompt(asset, ticker, thesis, units, avg_price, price, high52, low52)
+
+    cached = llm_cache.get(model, prompt)
+    if cached is not None:
+        return cached
 
-    # Exponential backoff for rate limits / transient errors
+    perf.miss()
+    # Exponential backoff for rate limits / transient errors, cut short once the
+    # OpenAI breaker opens (an outage fails fast instead of sleeping ~46s per position)
     last_err = None
     for attempt in range(5):
         try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return resp.choices[0].message.content
+            return cached_completion(api_key, model, prompt)
+
+        except circuit.CircuitOpen as e:
+            last_err = e
+            perf.tag(breaker=e.breaker.name)
+            break
 
         except Exception as e:
             last_err = e
+            if attempt == 4 or _openai_breaker().state == "open":
+                break  # out of attempts, or the breaker just opened: no point sleeping
             # backoff: 1.5s, 3s, 6s, 12s, 24s
-            time.sleep(1.5 * (2 ** attempt))
+            delay = 1.5 * (2 ** attempt)
+            perf.add("retries")
+            perf.add("sleep_s", delay)
+            time.sleep(delay)
 
     return f"⚠️ LLM temporarily unavailable. Last error: {last_err}"
+
+
+class AdaptiveLimiter:
+    """
+    Governs concurrent OpenAI calls: requests/min and tokens/min token buckets plus an
+    AIMD concurrency limit (+1 after a run of successes, halved on every 429).
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int = MAX_CONCURRENCY):
+        self.requests = TokenBucket.per_minute(rpm, burst=max(1, rpm // 6))
+        self.tokens = TokenBucket.per_minute(tpm, burst=max(1, tpm // 6))
+        self.max_concurrency = max_concurrency
+        self.limit = max(1, max_concurrency // 2)
+        self._active = 0
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, est_tokens: int):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        self.requests.acquire()
+        self.tokens.acquire(est_tokens)
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._streak = 0
+                self.requests.drain()
+            else:
+                self._streak += 1
+                if self._streak >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._streak = 0
+            self._cond.notify_all()
+
+
+def _retry_after(err, attempt: int) -> float:
+    try:
+        return float(err.response.headers.get("retry-after"))
+    except Exception:
+        return 1.5 * (2 ** attempt)
+
+
+def _governed(limiter: AdaptiveLimiter, est_tokens: int, max_attempts: int, call):
+    """
+    call() under the limiter, with our own backoff (Retry-After on 429s, exponential
+    otherwise). Returns its result or raises the last error; raises circuit.CircuitOpen
+    as soon as the OpenAI breaker is open.
+    """
+    breaker = _openai_breaker()
+    last_err = None
+    for attempt in range(max_attempts):
+        if not breaker.allow():
+            raise circuit.CircuitOpen(breaker)
+        limiter.acquire(est_tokens)
+        try:
+            result = call()
+        except RateLimitError as e:
+            limiter.release(throttled=True)
+            breaker.release()
+            last_err, delay = e, _retry_after(e, attempt)
+        except Exception as e:
+            limiter.release()
+            breaker.failure(e)
+            last_err, delay = e, 1.5 * (2 ** attempt)
+        else:
+            limiter.release()
+            breaker.success()
+            return result
+        if attempt + 1 < max_attempts and breaker.state != "open":
+            perf.add("retries")
+            perf.add("sleep_s", delay)
+            time.sleep(delay)
+    raise last_err
+
+
+def analyze_theses(
+    positions,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    rpm: int = DEFAULT_RPM,
+    tpm: int = DEFAULT_TPM,
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_attempts: int = 5,
+    stream: bool = False,
+):
+    """
+    Concurrent, rate-governed analyze_thesis over many positions.
+    positions: iterable of dicts with build_thesis_prompt's keyword args.
+    Yields (ticker, markdown) as each call finishes.
+    With stream=True, yields (ticker, text_so_far, finished) instead: partial text while
+    completions stream in (at most every STREAM_UPDATE_INTERVAL), then the final text.
+    """
+    positions = list(positions)
+    if not positions:
+        return
+
+    provider = get_provider()
+    limiter = AdaptiveLimiter(rpm, tpm, max_concurrency)
+    updates = queue.Queue() if stream else None
+
+    def complete(ticker, prompt):
+        messages = [{"role": "user", "content": prompt}]
+        # retries are ours, so 429s reach the limiter instead of being absorbed by the SDK
+        if updates is None:
+            return provider.chat(api_key, model, messages, max_retries=0)
+        parts = []
+        pushed = 0.0  # push the first delta right away
+        for delta in provider.chat_stream(api_key, model, messages, max_retries=0):
+            parts.append(delta)
+            if time.monotonic() - pushed >= STREAM_UPDATE_INTERVAL:
+                updates.put((ticker, "".join(parts)))
+                pushed = time.monotonic()
+        return "".join(parts)
+
+    @perf.timed("llm.analyze_thesis", cache=True)
+    def run(pos):
+        prompt = build_thesis_prompt(**pos)
+        cached = llm_cache.get(model, prompt)
+        if cached is not None:
+            return cached
+
+        perf.miss()
+        est_tokens = len(prompt) // 4 + 800  # prompt + expected completion
+        try:
+            text = _governed(limiter, est_tokens, max_attempts, lambda: complete(pos["ticker"], prompt))
+        except Exception as e:
+            perf.tag(error=type(e).__name__)
+            return f"⚠️ LLM temporarily unavailable. Last error: {e}"
+        llm_cache.put(model, prompt, text)
+        return text
+
+    run = perf.propagate(run)
+
+    def result(fut):
+        try:
+            return fut.result()
+        except Exception as e:
+            return f"⚠️ AI call failed (rate limit / network). {e}"
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(positions))) as pool:
+        futures = {pool.submit(run, p): p["ticker"] for p in positions}
+        if not stream:
+            for fut in as_completed(futures):
+                yield futures[fut], result(fut)
+            return
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=STREAM_UPDATE_INTERVAL, return_when=FIRST_COMPLETED)
+            while not updates.empty():
+                ticker, text = updates.get_nowait()
+                yield ticker, text, False
+            for fut in done:
+                yield futures[fut], result(fut), True
+
+
+# ---------------------------------------------------------
+# Batched thesis analysis (structured JSON)
+# ---------------------------------------------------------
+THESIS_STANCES = ("ACCUMULATE", "HOLD", "TRIM", "EXIT")
+BATCH_SIZE = 10
+
+BATCH_THESIS_INSTRUCTIONS = f"""
+You are my personal investment analyst. Evaluate each position below logically and concisely.
+
+For EVERY position return one object with exactly these keys:
+- "id": the position's id, unchanged
+- "ticker": the position's ticker, unchanged
+- "commentary": 3–4 sentences. Does the thesis broadly still hold? Evaluate current price vs my buy level and vs the 52W range.
+- "suggestions": 3–5 short strings refining the thesis (risks, catalysts, competition, macro)
+- "stance": exactly one of {", ".join(THESIS_STANCES)}
+- "stance_reason": one sentence justifying the stance
+- "signals": 3–5 specific KPIs, events, red flags or datapoints that confirm/break the thesis
+
+Respond with a JSON object {{"results": [ ... ]}} containing one object per position, nothing else.
+""".strip()
+
+
+def _position_line(pos: dict, **extra) -> str:
+    return json.dumps({
+        **extra,
+        "ticker": pos["ticker"],
+        "asset": pos["asset"],
+        "units": pos["units"],
+        "avg_price": pos["avg_price"],
+        "price": pos["price"],
+        "high52": pos["high52"],
+        "low52": pos["low52"],
+        "thesis": (pos.get("thesis") or "").strip() or "No thesis provided.",
+    }, ensure_ascii=False)
+
+
+def build_batch_thesis_prompt(positions: list) -> str:
+    """Shared instructions once, then one compact JSON line per position (id: its index in the batch)."""
+    lines = (_position_line(p, id=i) for i, p in enumerate(positions))
+    return BATCH_THESIS_INSTRUCTIONS + "\n\nPOSITIONS:\n" + "\n".join(lines)
+
+
+def _strings(value, lo: int = 1, hi: int = 8):
+    if not isinstance(value, list):
+        return None
+    items = [str(v).strip() for v in value if isinstance(v, (str, int, float)) and str(v).strip()]
+    return items[:hi] if len(items) >= lo else None
+
+
+def validate_thesis_item(item) -> dict | None:
+    """The item normalised to the thesis schema, or None when it doesn't conform."""
+    if not isinstance(item, dict):
+        return None
+    commentary = item.get("commentary")
+    stance = str(item.get("stance") or "").strip().upper()
+    suggestions, signals = _strings(item.get("suggestions")), _strings(item.get("signals"))
+    if not isinstance(commentary, str) or not commentary.strip() or stance not in THESIS_STANCES:
+        return None
+    if suggestions is None or signals is None:
+        return None
+    try:
+        item_id = int(item.get("id"))
+    except (TypeError, ValueError):
+        item_id = None
+    return {
+        "id": item_id,
+        "ticker": str(item.get("ticker") or "").strip(),
+        "commentary": commentary.strip(),
+        "suggestions": suggestions,
+        "stance": stance,
+        "stance_reason": str(item.get("stance_reason") or "").strip(),
+        "signals": signals,
+    }
+
+
+def parse_batch_response(text: str) -> dict:
+    """id -> validated item for every well-formed entry of a batch response."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    items = data.get("results") if isinstance(data, dict) else data
+    out = {}
+    for item in items if isinstance(items, list) else []:
+        valid = validate_thesis_item(item)
+        if valid is not None and valid["id"] is not None:
+            out[valid["id"]] = valid
+    return out
+
+
+def thesis_markdown(item: dict) -> str:
+    """Render a structured thesis item with the same headings as analyze_thesis."""
+    stance = f"**{item['stance']}**" + (f" — {item['stance_reason']}" if item["stance_reason"] else "")
+    return "\n".join([
+        "### Commentary", item["commentary"], "",
+        "### Suggested changes", *[f"- {s}" for s in item["suggestions"]], "",
+        "### Stance", stance, "",
+        "### Signals to monitor", *[f"- {s}" for s in item["signals"]],
+    ])
+
+
+def _item_cache_key(pos: dict) -> str:
+    # per position, so a cached verdict is reused whatever batch the position lands in
+    return "thesis-item:" + _position_line(pos)
+
+
+def analyze_theses_batched(
+    positions,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    batch_size: int = BATCH_SIZE,
+    rpm: int = DEFAULT_RPM,
+    tpm: int = DEFAULT_TPM,
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_attempts: int = 5,
+    item_attempts: int = 2,
+):
+    """
+    analyze_theses with several positions per request and schema-validated JSON output.
+    Positions whose item is missing or malformed are retried on their own (up to
+    item_attempts single-position requests) instead of repeating the whole batch.
+    Each item is cached individually. Yields (ticker, markdown) once per position
+    (duplicate tickers included) as results arrive.
+    """
+    positions = list(positions)
+    if not positions:
+        return
+
+    provider = get_provider()
+    limiter = AdaptiveLimiter(rpm, tpm, max_concurrency)
+
+    def request(batch):
+        prompt = build_batch_thesis_prompt(batch)
+        est_tokens = len(prompt) // 4 + 350 * len(batch)
+        messages = [{"role": "user", "content": prompt}]
+        text = _governed(limiter, est_tokens, max_attempts, lambda: provider.chat(
+            api_key, model, messages, max_retries=0, response_format=JSON_FORMAT,
+        ))
+        return parse_batch_response(text)
+
+    @perf.timed("llm.thesis_batch")
+    def run(batch):
+        """[(ticker, markdown)] for one batch, in batch order, retrying malformed items one by one."""
+        perf.tag(size=len(batch))
+        try:
+            items = request(batch)
+        except Exception as e:
+            perf.tag(error=type(e).__name__)
+            return [(p["ticker"], f"⚠️ LLM temporarily unavailable. Last error: {e}") for p in batch]
+
+        out = []
+        for i, pos in enumerate(batch):
+            item = items.get(i)
+            attempts = 0
+            while item is None and attempts < item_attempts:
+                attempts += 1
+                perf.add("item_retries")
+                try:
+                    item = request([pos]).get(0)
+                except Exception:
+                    item = None
+            if item is None:
+                out.append((pos["ticker"], "⚠️ AI returned no valid analysis for this position."))
+                continue
+            md = thesis_markdown(item)
+            llm_cache.put(model, _item_cache_key(pos), md)
+            out.append((pos["ticker"], md))
+        return out
+
+    # cached positions come back immediately; the rest is packed into batches
+    todo = []
+    for pos in positions:
+        cached = llm_cache.get(model, _item_cache_key(pos))
+        if cached is not None:
+            yield pos["ticker"], cached
+        else:
+            todo.append(pos)
+    if not todo:
+        return
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), max(1, batch_size))]
+    run = perf.propagate(run)
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+        futures = [pool.submit(run, b) for b in batches]
+        for fut in as_completed(futures):
+            yield from fut.result()
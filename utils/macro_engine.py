@@ -1,10 +1,92 @@
-from .market_data import get_index_price
+import pandas as pd
+
+from . import market_hours, swr
+from .market_data import get_price_snapshot
+
+# One macro snapshot for every consumer. Instruments either map to a single
+# Yahoo symbol or are derived from several base symbols; all base symbols are
+# fetched in a single batched snapshot and derived values computed from it.
+
+TROY_OUNCE_GRAMS = 31.1035
+DEFAULT_USDINR = 83.0
+SNAPSHOT_TTL = 900
+SNAPSHOT_DEADLINE = 10.0
+
+
+def _gold_inr_10g(px):
+    """Gold (GC=F, USD/oz) converted to INR per 10g with USDINR=X."""
+    fx_last = px["USDINR=X"][0] or DEFAULT_USDINR
+    fx_prev = px["USDINR=X"][1] or fx_last
+    usd_last, usd_prev = px["GC=F"]
+    if usd_last is None or usd_prev is None:
+        return None, None
+    return (
+        usd_last / TROY_OUNCE_GRAMS * fx_last * 10,
+        usd_prev / TROY_OUNCE_GRAMS * fx_prev * 10,
+    )
+
+
+INSTRUMENTS = {
+    "US 10Y": {"symbol": "^TNX"},
+    "VIX": {"symbol": "^VIX"},
+    "Nasdaq 100": {"symbol": "^NDX"},
+    "Nifty 50": {"symbol": "^NSEI"},
+    "Hang Seng": {"symbol": "^HSI"},
+    "BTC/USD": {"symbol": "BTC-USD"},
+    "USD/INR": {"symbol": "USDINR=X"},
+    "Crude Oil": {"symbol": "CL=F"},
+    "Gold": {"inputs": ["GC=F", "USDINR=X"], "derive": _gold_inr_10g},
+}
+
+
+def base_symbols(names=None) -> list:
+    """Every Yahoo symbol needed to compute the given instruments (default: all)."""
+    names = names or list(INSTRUMENTS)
+    symbols = set()
+    for name in names:
+        spec = INSTRUMENTS[name]
+        symbols.update(spec.get("inputs") or [spec["symbol"]])
+    return sorted(symbols)
+
+
+def build_snapshot(quotes: pd.DataFrame, names=None) -> dict:
+    """
+    quotes: get_price_snapshot() frame for base_symbols().
+    Returns {name: {"latest": float|None, "prev": float|None, "pct_change": float|None}}.
+    """
+    def last_prev(symbol):
+        if symbol not in quotes.index:
+            return None, None
+        last, prev = quotes.loc[symbol, "current_price"], quotes.loc[symbol, "prev_close"]
+        return (None if pd.isnull(last) else float(last)), (None if pd.isnull(prev) else float(prev))
+
+    out = {}
+    for name in names or INSTRUMENTS:
+        spec = INSTRUMENTS[name]
+        if "derive" in spec:
+            latest, prev = spec["derive"]({s: last_prev(s) for s in spec["inputs"]})
+        else:
+            latest, prev = last_prev(spec["symbol"])
+        pct = (latest - prev) / prev * 100 if latest is not None and prev else None
+        out[name] = {"latest": latest, "prev": prev, "pct_change": pct}
+    return out
+
+
+def _snapshot_ttl() -> float:
+    # with BTC-USD in the set this rarely exceeds SNAPSHOT_TTL; closed markets are
+    # still skipped by the per-market bar refresh underneath (market_data)
+    return market_hours.cache_ttl(base_symbols(), SNAPSHOT_TTL)
+
+
+@swr.cached("macro.snapshot", ttl=_snapshot_ttl, deadline=SNAPSHOT_DEADLINE)
+def get_macro_snapshot() -> dict:
+    """All INSTRUMENTS from one batched price snapshot (see build_snapshot)."""
+    return build_snapshot(get_price_snapshot(base_symbols()))
+
 
 def fetch_macro():
+    snap = get_macro_snapshot()
     return {
-        "US 10Y": get_index_price("^TNX"),
-        "VIX": get_index_price("^VIX"),
-        "Nasdaq 100": get_index_price("^NDX"),
-        "Nifty 50": get_index_price("^NSEI"),
-        "Hang Seng": get_index_price("^HSI"),
+        name: snap[name]["latest"]
+        for name in ["US 10Y", "VIX", "Nasdaq 100", "Nifty 50", "Hang Seng"]
     }
@@ -1,24 +1,308 @@
-import yfinance as yf
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from enum import Enum
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from yfinance.exceptions import (
+    YFPricesMissingError,
+    YFRateLimitError,
+    YFTickerMissingError,
+    YFTzMissingError,
+)
+
+from . import circuit, market_hours, ohlcv_store, perf, swr
+from .providers import FixtureMissing, get_provider
+
+# hard per-call deadlines (seconds) for the first fetch of a value; later
+# refreshes happen in the background while the last good value is served.
+# The TTLs apply while a symbol's market is live; otherwise values are kept
+# until it opens again (see market_hours.cache_ttl).
+QUOTE_TTL = 60
+QUOTE_DEADLINE = 4.0
+BARS_TTL = 60
+BARS_DEADLINE = 8.0
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="market-data")
+
+
+class QuoteError(str, Enum):
+    NO_DATA = "no_data"                # Yahoo answered but had nothing usable
+    INVALID_TICKER = "invalid_ticker"  # unknown / delisted symbol
+    RATE_LIMITED = "rate_limited"
+    NETWORK = "network"
+    UNKNOWN = "unknown"
+
+
+class Quote(NamedTuple):
+    price: float | None
+    high_52: float | None
+    low_52: float | None
+    source: str | None = None          # "bars", "fast_info" or "info"
+    error: QuoteError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.price is not None
+
+
+def _num(x):
+    try:
+        x = float(x)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(x) else x
+
+
+def _classify_error(e: Exception) -> QuoteError:
+    if isinstance(e, (YFTickerMissingError, YFTzMissingError, YFPricesMissingError)):
+        return QuoteError.INVALID_TICKER
+    if isinstance(e, FixtureMissing):
+        return QuoteError.NO_DATA
+    if isinstance(e, YFRateLimitError):
+        return QuoteError.RATE_LIMITED
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status == 429:
+        return QuoteError.RATE_LIMITED
+    if status == 404:
+        return QuoteError.INVALID_TICKER
+    # requests and yfinance's curl_cffi transport both raise OSError subclasses
+    # (connection refused, DNS, timeouts, resets)
+    if isinstance(e, OSError):
+        return QuoteError.NETWORK
+    return QuoteError.UNKNOWN
+
+
+# outages count against Yahoo as a whole; any other failure against the symbol
+PROVIDER_ERRORS = (QuoteError.NETWORK, QuoteError.RATE_LIMITED)
+
+
+def _breaker_error(breaker) -> QuoteError:
+    try:
+        return QuoteError(breaker.last_error)
+    except ValueError:
+        return QuoteError.UNKNOWN
+
+
+def _report(symbol, yahoo, error: QuoteError | None):
+    """Feed one get_quote outcome to the symbol / Yahoo breakers."""
+    if error is None:
+        symbol.success()
+        yahoo.success()
+    elif error in PROVIDER_ERRORS:
+        yahoo.failure(error.value)
+        symbol.release()  # says nothing about the symbol
+    else:
+        symbol.failure(error.value)
+        yahoo.success()  # Yahoo answered; the symbol is the problem
+
+
+def _quote_ttl(ticker: str) -> float:
+    return market_hours.cache_ttl([ticker], QUOTE_TTL)
+
+
+@swr.cached("market.fast_info", ttl=_quote_ttl, deadline=QUOTE_DEADLINE)
+def _fast_info(ticker: str) -> dict:
+    return get_provider().fast_info(ticker)
+
+
+@swr.cached("market.info", ttl=_quote_ttl, deadline=QUOTE_DEADLINE)
+def _info(ticker: str) -> dict:
+    return get_provider().info(ticker) or {}
+
+
+@perf.timed("market.quote")
+def get_quote(ticker: str, allow_info: bool = False, use_bars: bool = True) -> Quote:
+    """
+    Last price and 52w range for one ticker, cheapest source first:
+    1) the local daily-bar store (incremental refresh), 2) yfinance fast_info,
+    3) the slow .info scrape, only when allow_info=True.
+    Failures come back as Quote(..., error=QuoteError.*) instead of silent Nones.
+    A symbol that recently failed (or Yahoo while it is failing) is answered from
+    its circuit breaker without a network call.
+    """
+    ticker = str(ticker).strip()
+    if not ticker:
+        return Quote(None, None, None, error=QuoteError.INVALID_TICKER)
+
+    error = QuoteError.NO_DATA
+    price = None
+
+    if use_bars:
+        snap = get_price_snapshot([ticker])
+        price, high, low = (_num(snap.loc[ticker, c]) for c in ["current_price", "52w_high", "52w_low"])
+        if price is not None and high is not None and low is not None:
+            perf.tag(source="bars")
+            return Quote(price, high, low, source="bars")
+
+    symbol, yahoo = circuit.get(f"symbol:{ticker}"), circuit.get("provider:yahoo")
+    for breaker in (symbol, yahoo):
+        if not breaker.allow():
+            if breaker is yahoo:
+                symbol.release()  # the symbol may have just granted us its probe
+            error = _breaker_error(breaker)
+            perf.tag(error=error.value, breaker=breaker.name)
+            return Quote(None, None, None, error=error)
+
+    try:
+        fi = _fast_info(ticker)
+        price = price if price is not None else _num(fi["lastPrice"])
+        high, low = _num(fi["yearHigh"]), _num(fi["yearLow"])
+        if price is not None:
+            perf.tag(source="fast_info")
+            _report(symbol, yahoo, None)
+            return Quote(price, high, low, source="fast_info")
+    except Exception as e:
+        error = _classify_error(e)
+
+    if allow_info:
+        try:
+            info = _info(ticker)
+            price = _num(info.get("regularMarketPrice") or info.get("currentPrice"))
+            if price is not None:
+                perf.tag(source="info")
+                _report(symbol, yahoo, None)
+                return Quote(price, _num(info.get("fiftyTwoWeekHigh")), _num(info.get("fiftyTwoWeekLow")), source="info")
+        except Exception as e:
+            error = _classify_error(e)
+
+    perf.tag(error=error.value)
+    _report(symbol, yahoo, error)
+    return Quote(None, None, None, error=error)
+
+
+def get_fallback_quotes(tickers, deadline: float = QUOTE_DEADLINE) -> dict:
+    """
+    get_quote(..., use_bars=False) for many tickers at once, all sharing one deadline.
+    Returns {ticker: Quote}; tickers still unanswered at the deadline come back as
+    NETWORK errors (their fetches keep running and warm the cache).
+    """
+    tickers = sorted({str(t).strip() for t in tickers if str(t).strip()})
+    futures = {t: _pool.submit(perf.propagate(get_quote), t, use_bars=False) for t in tickers}
+    done, _ = wait(futures.values(), timeout=deadline)
+    quotes = {}
+    for t, fut in futures.items():
+        if fut in done:
+            quotes[t] = fut.result()
+        else:
+            fut.cancel()
+            quotes[t] = Quote(None, None, None, error=QuoteError.NETWORK)
+    return quotes
+
 
 def get_stock_price(ticker):
+    """Returns (price, 52w_high, 52w_low); see get_quote for the reason when price is None."""
+    q = get_quote(ticker)
+    return q.price, q.high_52, q.low_52
+
+
+CRYPTO_TTL = 60  # seconds; keeps us well inside CoinGecko's free-tier rate limit
+CRYPTO_DEADLINE = 4.0
+CRYPTO_COLUMNS = [
+    "usd", "inr", "usd_24h_change", "inr_24h_change",
+    "usd_market_cap", "inr_market_cap", "usd_24h_vol", "inr_24h_vol", "last_updated_at",
+]
+
+
+@swr.cached("market.coingecko", ttl=CRYPTO_TTL, deadline=CRYPTO_DEADLINE, fallback={})
+def _crypto_prices(ids: tuple) -> dict:
+    breaker = circuit.get("provider:coingecko")
+    if not breaker.allow():
+        raise circuit.CircuitOpen(breaker)
     try:
-        data = yf.Ticker(ticker)
-        hist = data.history(period="1d")
-        price = hist["Close"].iloc[-1]
-        high_52 = data.info.get("fiftyTwoWeekHigh", None)
-        low_52 = data.info.get("fiftyTwoWeekLow", None)
-        return price, high_52, low_52
-    except:
-        return None, None, None
+        data = get_provider().crypto_prices({
+            "ids": ",".join(ids),
+            "vs_currencies": "usd,inr",
+            "include_market_cap": "true",
+            "include_24hr_vol": "true",
+            "include_24hr_change": "true",
+            "include_last_updated_at": "true",
+        })
+    except Exception as e:
+        breaker.failure(e)
+        raise
+    breaker.success()
+    return data
+
+
+@perf.timed("market.crypto_quotes")
+def get_crypto_quotes(ids) -> pd.DataFrame:
+    """
+    USD + INR price, 24h change, market cap and volume for many CoinGecko ids in one request.
+    Returns a DataFrame indexed by coin id with CRYPTO_COLUMNS (NaN for unknown ids).
+    Quotes are cached for CRYPTO_TTL seconds and refreshed in the background after that.
+    """
+    ids = sorted({str(i).strip().lower() for i in ids if str(i).strip()})
+    data = _crypto_prices(tuple(ids)) if ids else {}
+
+    quotes = pd.DataFrame.from_dict(data, orient="index").reindex(index=ids, columns=CRYPTO_COLUMNS)
+    quotes.index.name = "id"
+    return quotes.astype(float)
+
 
 def get_crypto_price(id):
-    url = f"https://api.coingecko.com/api/v3/simple/price?ids={id}&vs_currencies=usd"
-    try:
-        r = requests.get(url).json()
-        return r[id]['usd']
-    except:
-        return None
+    price = get_crypto_quotes([id])["usd"].iloc[0] if str(id).strip() else None
+    return None if pd.isnull(price) else float(price)
+
 
 def get_index_price(ticker):
     return get_stock_price(ticker)[0]
+
+
+SNAPSHOT_COLUMNS = ["current_price", "prev_close", "day_change_pct", "52w_high", "52w_low"]
+
+
+def _bars_ttl(tickers: tuple) -> float:
+    return market_hours.cache_ttl(tickers, BARS_TTL)
+
+
+@swr.cached("market.bars_update", ttl=_bars_ttl, deadline=BARS_DEADLINE, fallback=None)
+def _update_bars(tickers: tuple):
+    ohlcv_store.update(tickers, raise_errors=True)
+
+
+@perf.timed("market.price_snapshot")
+def get_price_snapshot(tickers, refresh: bool = True) -> pd.DataFrame:
+    """
+    Current price, previous close, day change %, 52w high and 52w low for a set of tickers,
+    all computed from one price matrix (local OHLCV store, incrementally refreshed).
+    Bars are refreshed per market (one batched download each, all in parallel), and
+    only while that market is live or has closed since the last refresh; a refresh
+    that misses BARS_DEADLINE leaves the bars already stored in place.
+    Returns a DataFrame indexed by ticker with SNAPSHOT_COLUMNS; unknown tickers are NaN.
+    """
+    tickers = sorted({str(t).strip() for t in tickers if str(t).strip()})
+    snap = pd.DataFrame(index=pd.Index(tickers, name="ticker"), columns=SNAPSHOT_COLUMNS, dtype=float)
+    if not tickers:
+        return snap
+
+    if refresh:
+        # one refresh per market, all started together so they share BARS_DEADLINE
+        groups = market_hours.group_by_market(tickers).values()
+        wait([_pool.submit(perf.propagate(_update_bars), tuple(g)) for g in groups])
+    bars = ohlcv_store.load_bars(tickers)
+    if bars.empty:
+        return snap
+
+    close = bars.pivot(index="date", columns="ticker", values="Close")
+    high = bars.pivot(index="date", columns="ticker", values="High")
+    low = bars.pivot(index="date", columns="ticker", values="Low")
+
+    # last two valid closes per ticker (tickers can have gaps on exchange holidays)
+    last_two = {t: close[t].dropna().tail(2).tolist() for t in close.columns}
+    snap["current_price"] = pd.Series({t: v[-1] if v else np.nan for t, v in last_two.items()}, dtype=float)
+    snap["prev_close"] = pd.Series({t: v[-2] if len(v) > 1 else np.nan for t, v in last_two.items()}, dtype=float)
+    snap["day_change_pct"] = (snap["current_price"] - snap["prev_close"]) / snap["prev_close"].replace(0, np.nan) * 100
+    snap["52w_high"] = high.max().reindex(snap.index)
+    snap["52w_low"] = low.min().reindex(snap.index)
+    return snap
+
+
+@perf.timed("market.bulk_quotes")
+def get_bulk_quotes(tickers) -> pd.DataFrame:
+    """
+    Last price and 52w range for a whole list of tickers.
+    Returns a DataFrame indexed by ticker with columns: current_price, 52w_high, 52w_low.
+    Tickers Yahoo returned nothing for are present with NaN values.
+    """
+    return get_price_snapshot(tickers)[["current_price", "52w_high", "52w_low"]]
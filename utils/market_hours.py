@@ -0,0 +1,123 @@
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import streamlit as st
+
+# Trading sessions per market, so cached quotes live until the market can
+# actually move again: dense refreshes during a session (plus a settle window
+# after the close while Yahoo finalizes the last bar), none overnight, on
+# weekends or on configured holidays.
+#
+# Symbols map to a market by their Yahoo suffix: ".NS" / ".BO" -> NSE,
+# "=X" -> FX, "=F" -> futures, "-USD" -> crypto, plain symbols -> US.
+# Exchange holidays can be listed in secrets:
+#
+#     [market_hours.holidays]
+#     US = ["2026-11-26", "2026-12-25"]
+#     NSE = ["2026-11-09"]
+
+SETTLE = timedelta(minutes=30)   # a market counts as live this long after its close
+MAX_CLOSED_TTL = 4 * 86400       # never cache longer than this, whatever the calendar says
+
+_WEEKDAYS = range(5)
+_ALL_DAY = (dtime(0), None)      # None: until midnight
+
+# market -> (time zone, {weekday: [(open, close), ...]}) in exchange-local time
+MARKETS = {
+    "US": ("America/New_York", {d: [(dtime(9, 30), dtime(16))] for d in _WEEKDAYS}),
+    "NSE": ("Asia/Kolkata", {d: [(dtime(9, 15), dtime(15, 30))] for d in _WEEKDAYS}),
+    "HKEX": ("Asia/Hong_Kong", {d: [(dtime(9, 30), dtime(16, 10))] for d in _WEEKDAYS}),
+    # spot FX trades Sunday 17:00 to Friday 17:00 New York time
+    "FX": ("America/New_York", {
+        6: [(dtime(17), None)], **{d: [_ALL_DAY] for d in range(4)}, 4: [(dtime(0), dtime(17))],
+    }),
+    # CME Globex: Sunday 18:00 to Friday 17:00 ET with a daily 17:00-18:00 halt
+    "FUTURES": ("America/New_York", {
+        6: [(dtime(18), None)],
+        **{d: [(dtime(0), dtime(17)), (dtime(18), None)] for d in range(4)},
+        4: [(dtime(0), dtime(17))],
+    }),
+    "CRYPTO": ("UTC", {d: [_ALL_DAY] for d in range(7)}),
+}
+
+# index symbols that don't trade on US hours
+_INDEX_MARKETS = {"^NSEI": "NSE", "^BSESN": "NSE", "^NSEBANK": "NSE", "^HSI": "HKEX"}
+
+
+def market_for(symbol: str) -> str:
+    """Market key (see MARKETS) for a Yahoo symbol."""
+    s = str(symbol).strip().upper()
+    if s in _INDEX_MARKETS:
+        return _INDEX_MARKETS[s]
+    if s.endswith((".NS", ".BO")):
+        return "NSE"
+    if s.endswith(".HK"):
+        return "HKEX"
+    if s.endswith("=X"):
+        return "FX"
+    if s.endswith("=F"):
+        return "FUTURES"
+    if s.endswith(("-USD", "-INR", "-USDT")):
+        return "CRYPTO"
+    return "US"
+
+
+def _holidays(market: str) -> set:
+    try:
+        days = st.secrets.get("market_hours", {}).get("holidays", {}).get(market, [])
+    except Exception:
+        days = []
+    return {str(d) for d in days}
+
+
+def _sessions(market: str, around: datetime):
+    """Live windows (open, close + SETTLE) as aware datetimes from the day before `around` to a week after."""
+    tz_name, schedule = MARKETS[market]
+    tz = ZoneInfo(tz_name)
+    holidays = _holidays(market)
+    today = around.astimezone(tz).date()
+    for offset in range(-1, 8):
+        day = today + timedelta(days=offset)
+        if day.isoformat() in holidays:
+            continue
+        for open_, close in schedule.get(day.weekday(), []):
+            start = datetime.combine(day, open_, tz)
+            end = datetime.combine(day + timedelta(days=1), dtime(0), tz) if close is None else datetime.combine(day, close, tz)
+            yield start, end + SETTLE
+
+
+def is_live(market: str, now: datetime | None = None) -> bool:
+    """True during a session of this market (or within SETTLE after its close)."""
+    now = now or datetime.now(ZoneInfo("UTC"))
+    return any(start <= now < end for start, end in _sessions(market, now))
+
+
+def seconds_until_open(market: str, now: datetime | None = None) -> float:
+    """0 while the market is live, else seconds until its next session starts."""
+    now = now or datetime.now(ZoneInfo("UTC"))
+    upcoming = []
+    for start, end in _sessions(market, now):
+        if start <= now < end:
+            return 0.0
+        if start > now:
+            upcoming.append(start)
+    return (min(upcoming) - now).total_seconds() if upcoming else float(MAX_CLOSED_TTL)
+
+
+def cache_ttl(symbols, live_ttl: float, now: datetime | None = None) -> float:
+    """
+    How long quotes for these symbols stay valid when fetched now: live_ttl while
+    any of their markets is live, otherwise until the first of them opens again.
+    """
+    now = now or datetime.now(ZoneInfo("UTC"))
+    markets = {market_for(s) for s in symbols} or {"US"}
+    wait = min(seconds_until_open(m, now) for m in markets)
+    return live_ttl if wait <= 0 else min(max(wait, live_ttl), MAX_CLOSED_TTL)
+
+
+def group_by_market(symbols) -> dict:
+    """{market: [symbols]}, so closed markets can be skipped as a block."""
+    groups = {}
+    for s in symbols:
+        groups.setdefault(market_for(s), []).append(s)
+    return groups
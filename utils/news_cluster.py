@@ -0,0 +1,109 @@
+import re
+
+import numpy as np
+
+# Near-duplicate headline clustering: word-shingle MinHash signatures, LSH band
+# buckets to find candidate pairs in linear time, and a signature-agreement
+# check before two headlines are merged. Syndicated copies of one story
+# (Reuters / Yahoo / SeekingAlpha, or the same story filed under several
+# tickers) collapse into a single item.
+
+NUM_PERM = 64
+BANDS = 16          # 16 bands x 4 rows: pairs above ~0.5 similarity almost always share a bucket
+THRESHOLD = 0.5     # estimated Jaccard needed to merge two headlines
+CHUNK = 4096        # headlines hashed per numpy batch (bounds memory)
+
+# multiply-shift hashing: h(x) = (a * x + b) >> 32 with wrap-around uint64 arithmetic
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 62, NUM_PERM // BANDS, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+# wire prefixes / suffixes that differ between syndicated copies
+_BOILERPLATE = re.compile(r"^\s*(?:update\s*\d*\s*[-:]|exclusive\s*[-:]|\(reuters\)\s*-)|\s+[-|]\s+[^-|]{2,30}$", re.I)
+
+
+def _shingles(headline: str) -> list:
+    """32-bit hashes of the headline's word bigrams (single words for one-word headlines)."""
+    words = _WORD.findall(_BOILERPLATE.sub("", headline or "").lower())
+    # hash() is salted per process, which is fine: signatures are only compared in-process
+    return [hash(g) & 0xFFFFFFFF for g in zip(words, words[1:])] or [hash(w) & 0xFFFFFFFF for w in words] or [0]
+
+
+def signatures(headlines) -> np.ndarray:
+    """(len(headlines), NUM_PERM) MinHash signature matrix."""
+    shingles = [_shingles(h) for h in headlines]
+    sig = np.empty((len(shingles), NUM_PERM), dtype=np.uint64)
+    for lo in range(0, len(shingles), CHUNK):
+        chunk = shingles[lo:lo + CHUNK]
+        flat = np.fromiter((x for s in chunk for x in s), dtype=np.uint64)
+        offsets = np.cumsum([0] + [len(s) for s in chunk[:-1]])
+        hashed = (_A[:, None] * flat + _B[:, None]) >> np.uint64(32)  # (NUM_PERM, shingles)
+        sig[lo:lo + len(chunk)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return sig
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_ids(headlines, threshold: float = THRESHOLD) -> np.ndarray:
+    """Cluster label per headline (the index of the cluster's first member)."""
+    n = len(headlines)
+    if n == 0:
+        return np.empty(0, dtype=int)
+    sig = signatures(headlines)
+    rows = NUM_PERM // BANDS
+
+    # candidate edges: every bucket member -> the bucket's first member, per band
+    edges = []
+    for b in range(BANDS):
+        keys = sig[:, b * rows:(b + 1) * rows] @ _BAND_MIX  # one 64-bit key per band
+        order = np.argsort(keys, kind="stable")
+        new_bucket = np.r_[True, np.diff(keys[order]) != 0]
+        leaders = order[np.flatnonzero(new_bucket)[np.cumsum(new_bucket) - 1]]
+        members = ~new_bucket
+        edges.append(np.stack([order[members], leaders[members]], axis=1))
+    edges = np.unique(np.concatenate(edges), axis=0)
+
+    # keep only pairs whose signatures agree enough (estimated Jaccard)
+    if len(edges):
+        agree = (sig[edges[:, 0]] == sig[edges[:, 1]]).mean(axis=1)
+        edges = edges[agree >= threshold]
+
+    parent = list(range(n))
+    for i, j in edges.tolist():
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.array([_find(parent, i) for i in range(n)])
+
+
+def cluster_news(news: list, threshold: float = THRESHOLD) -> list:
+    """
+    Collapse near-duplicate headlines. Input order is kept (so pass most recent first);
+    each cluster is represented by its first item, extended with:
+    tickers (all linked tickers), sources (all sources) and duplicates (number of
+    other articles merged into it; the same article under another ticker doesn't count).
+    """
+    labels = cluster_ids([n["headline"] for n in news], threshold)
+    clusters = {}
+    articles = {}
+    for n, label in zip(news, labels.tolist()):
+        rep = clusters.get(label)
+        if rep is None:
+            clusters[label] = rep = {**n, "tickers": [], "sources": [], "duplicates": 0}
+            articles[label] = set()
+        article = (n["headline"], n.get("url"))
+        if articles[label] and article not in articles[label]:
+            rep["duplicates"] += 1
+        articles[label].add(article)
+        if n.get("ticker") and n["ticker"] not in rep["tickers"]:
+            rep["tickers"].append(n["ticker"])
+        if n.get("source") and n["source"] not in rep["sources"]:
+            rep["sources"].append(n["source"])
+    return list(clusters.values())
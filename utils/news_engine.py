@@ -1,22 +1,235 @@
-import streamlit as st
+import re
+import time
+
+import numpy as np
 import requests
-from datetime import datetime, timedelta
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from . import circuit, news_cluster, news_store, perf
+from .providers import get_provider
+from .rate_limit import TokenBucket
+
+# Finnhub free tier: 60 calls/minute. Keep a little headroom.
+FINNHUB_CALLS_PER_MINUTE = 55
+MAX_WORKERS = 8
+BACKFILL_DAYS = 7         # history requested the first time a ticker is seen
+DEFAULT_WINDOW_DAYS = 2   # what the News page shows by default
 
-def fetch_news_finnhub(ticker):
-    api_key = st.secrets["finnhub"]["api_key"]
-    
+_limiter = TokenBucket.per_minute(FINNHUB_CALLS_PER_MINUTE, burst=10)
+
+
+def fetch_news_finnhub(ticker, api_key=None, since=None):
+    """
+    Finnhub company news for one ticker published at or after `since` (unix seconds,
+    default: 24h ago). Returns a list of items, or None when the request failed
+    (or was skipped because the Finnhub breaker is open).
+    """
+    api_key = api_key or st.secrets["finnhub"]["api_key"]
+
+    since = int(since if since is not None else time.time() - 86400)
+    date_from = datetime.utcfromtimestamp(since).date()  # Finnhub filters by whole days
     today = datetime.utcnow().date()
-    yesterday = today - timedelta(days=1)
 
-    url = (
-        f"https://finnhub.io/api/v1/company-news"
-        f"?symbol={ticker}&from={yesterday}&to={today}&token={api_key}"
-    )
+    breaker = circuit.get("provider:finnhub")
+    with perf.span("news.finnhub") as s:
+        if not breaker.allow():
+            s["breaker"] = breaker.name
+            return None
+        try:
+            waited = time.perf_counter()
+            _limiter.acquire()
+            s["sleep_s"] = time.perf_counter() - waited  # time spent queued on the rate limiter
+            news = get_provider().company_news(ticker, str(date_from), str(today), api_key)
+            items = [n for n in news or [] if int(n.get("datetime") or 0) >= since]
+        except requests.HTTPError as e:
+            s["error"] = "HTTPError"
+            if e.response is not None and e.response.status_code == 429:
+                _limiter.drain()  # over quota: slow every worker down
+                breaker.release()
+            else:
+                breaker.failure(e)
+            return None
+        except Exception as e:
+            s["error"] = type(e).__name__
+            breaker.failure(e)
+            return None
+        breaker.success()
+        return items
+
+
+def iter_news_finnhub(tickers, max_workers: int = MAX_WORKERS, api_key=None, since=None):
+    """
+    Fetch news for many tickers concurrently (bounded pool, shared session, rate-limited).
+    since: optional {ticker: unix seconds} lower bound per ticker.
+    Yields (ticker, items) in completion order; items is None when the fetch failed.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return
+    since = since or {}
+
+    # resolve the key on the calling (script) thread
+    api_key = api_key or st.secrets["finnhub"]["api_key"]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as pool:
+        fetch = perf.propagate(fetch_news_finnhub)
+        futures = {pool.submit(fetch, t, api_key, since.get(t)): t for t in tickers}
+        for fut in as_completed(futures):
+            try:
+                items = fut.result()
+            except Exception:
+                items = None
+            yield futures[fut], items
+
+
+@perf.timed("news.ingest")
+def ingest_news(tickers, api_key=None) -> int:
+    """
+    Pull only headlines newer than each ticker's watermark into the local news store
+    (a BACKFILL_DAYS window for tickers seen for the first time).
+    Returns the number of new headlines stored.
+    """
+    tickers = sorted({str(t).strip() for t in tickers if str(t).strip()})
+    marks = news_store.watermarks(tickers)
+    floor = int(time.time()) - BACKFILL_DAYS * 86400
+    since = {t: marks.get(t, floor) for t in tickers}
+
+    added = 0
+    for tkr, items in iter_news_finnhub(tickers, api_key=api_key, since=since):
+        if items is not None:  # failed fetches keep their watermark and retry next time
+            added += news_store.save(tkr, items, since[tkr])
+    perf.tag(added=added)
+    return added
+
+
+@perf.timed("news.load")
+def load_news(tickers, days: float = DEFAULT_WINDOW_DAYS) -> list:
+    """
+    Stored headlines from the last `days` days, most recent first (no network).
+    Near-duplicates (syndicated copies, the same story under several tickers) are
+    collapsed into one item.
+    Returns list[dict] with keys: headline, source, datetime, url, ticker,
+    tickers, sources, duplicates
+    """
+    news = news_store.query(tickers, since=time.time() - days * 86400)
+    clustered = news_cluster.cluster_news(news)
+    perf.tag(raw=len(news), clusters=len(clustered))
+    return clustered
+
+
+@perf.timed("news.portfolio")
+def fetch_portfolio_news(tickers, api_key=None, days: float = DEFAULT_WINDOW_DAYS):
+    """
+    Ingest new headlines for these tickers, then read the window from the local store
+    (see load_news for the returned items).
+    """
+    ingest_news(tickers, api_key=api_key)
+    return load_news(tickers, days)
 
+
+# Checked in order: a headline gets the first category with any matching keyword.
+# Keywords match whole words (case-insensitive); a trailing "*" matches any word
+# ending ("acquir*" -> acquire, acquired, acquiring). Override in secrets:
+#
+#     [news.categories]
+#     Earnings = ["earnings", "eps", "guidance"]
+HEADLINE_CATEGORIES = {
+    "Earnings": ["earnings", "eps", "revenue*", "sales", "guidance", "q1", "q2", "q3", "q4", "quarter*",
+                 "results", "profit*", "margin*"],
+    "M&A": ["acquir*", "acquisition*", "merger*", "buyout*", "takeover*", "deal*", "stake*",
+            "invests in", "to buy", "sale"],
+    "Regulation": ["regulator*", "sec", "antitrust", "doj", "probe*", "lawsuit*", "ban", "bans", "banned",
+                   "sanction*", "compliance", "fine", "fined", "fines", "policy", "tariff*"],
+    "Product": ["launch*", "unveil*", "releas*", "product*", "chip*", "ai", "model*", "vehicle*", "ev", "evs",
+                "software", "update*", "partnership*"],
+    "Macro": ["fed", "inflation", "rates", "yield*", "oil", "gold", "dollar*", "usd", "rupee*", "macro",
+              "economy", "recession*", "cpi", "jobs"],
+    "Legal": ["court*", "lawsuit*", "settlement*", "appeal*", "injunction*", "patent*", "ip",
+              "litigation"],
+}
+DEFAULT_CATEGORY = "Other"
+
+
+def _keyword_pattern(word: str) -> str:
+    if word.endswith("*"):
+        return re.escape(word[:-1]) + r"\w*"
+    return re.escape(word)
+
+
+class HeadlineClassifier:
+    """
+    All category keywords compiled into one word-boundary regex (one capture group
+    per category), so a whole batch of headlines is classified in a single scan.
+    """
+
+    def __init__(self, categories: dict, default: str = DEFAULT_CATEGORY):
+        self.labels = list(categories) + [default]
+        seen = set()
+        groups = []
+        first_chars = set()
+        for words in categories.values():
+            # a keyword listed under several categories belongs to the first one
+            words = [w.strip().lower() for w in words if w.strip()]
+            words = [w for w in dict.fromkeys(words) if w not in seen]
+            seen.update(words)
+            first_chars.update(w[0] for w in words)
+            # longest first so "invests in" is tried before shorter overlaps
+            patterns = sorted((_keyword_pattern(w) for w in words), key=len, reverse=True)
+            groups.append("(" + ("|".join(patterns) or "(?!)") + ")")
+
+        self._pattern = None
+        if first_chars:
+            # only try the alternation at word starts whose first letter begins some keyword
+            start = r"\b" if all(re.match(r"\w", c) for c in first_chars) else r"(?<!\w)"
+            start += "(?=[" + "".join(re.escape(c) for c in sorted(first_chars)) + "])"
+            self._pattern = re.compile(start + "(?:" + "|".join(groups) + r")(?!\w)")
+
+    def classify(self, headlines) -> list:
+        """Category for every headline, in order."""
+        texts = ["" if h is None else str(h).lower() for h in headlines]
+        if not texts or self._pattern is None:
+            return [self.labels[-1]] * len(texts)
+        # scan all headlines joined into one string, then map matches back by offset
+        starts = np.cumsum([0] + [len(t) + 1 for t in texts[:-1]])
+        best = np.full(len(texts), len(self.labels) - 1)
+        positions, ranks = [], []
+        for m in self._pattern.finditer("\n".join(texts)):
+            positions.append(m.start())
+            ranks.append(m.lastindex - 1)
+        if positions:
+            rows = np.searchsorted(starts, positions, side="right") - 1
+            np.minimum.at(best, rows, ranks)
+        return [self.labels[i] for i in best]
+
+
+def _configured_categories() -> dict:
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        news = r.json()
-        return news[:5]  # top 5
-    except Exception as e:
-        return []
+        custom = st.secrets.get("news", {}).get("categories")
+    except Exception:
+        custom = None
+    return {k: list(v) for k, v in custom.items()} if custom else HEADLINE_CATEGORIES
+
+
+_classifier = None
+
+
+def get_classifier() -> HeadlineClassifier:
+    """Process-wide classifier built once from HEADLINE_CATEGORIES (or secrets)."""
+    global _classifier
+    if _classifier is None:
+        _classifier = HeadlineClassifier(_configured_categories())
+    return _classifier
+
+
+def classify_headlines(headlines) -> list:
+    """Batch keyword classification for filtering; returns one category per headline."""
+    return get_classifier().classify(headlines)
+
+
+def classify_headline(headline: str) -> str:
+    """
+    Simple keyword classifier for filtering.
+    """
+    return classify_headlines([headline])[0]
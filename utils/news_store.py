@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+
+from . import db
+from .paths import data_path
+
+# Headlines kept on disk so a refresh only asks Finnhub for items newer than the
+# per-ticker watermark, dedupe survives restarts, and the News page can query
+# any window from local data.
+
+DB_PATH = data_path("news.sqlite")
+RETENTION_DAYS = 30
+
+_write_lock = threading.Lock()
+
+
+def _schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS articles (
+            key      TEXT PRIMARY KEY,
+            ticker   TEXT NOT NULL,
+            headline TEXT NOT NULL,
+            source   TEXT,
+            datetime INTEGER NOT NULL,
+            url      TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS articles_ticker_time ON articles (ticker, datetime)")
+    # every ticker an article was fetched for (articles.ticker is the first one)
+    has_mentions = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'mentions'").fetchone()
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mentions (
+            key    TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            PRIMARY KEY (ticker, key)
+        )
+        """
+    )
+    if not has_mentions:
+        conn.execute("INSERT OR IGNORE INTO mentions SELECT key, ticker FROM articles")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS watermarks (
+            ticker     TEXT PRIMARY KEY,
+            last_ts    INTEGER NOT NULL,
+            checked_at REAL NOT NULL
+        )
+        """
+    )
+
+
+def _connect():
+    return db.connect(DB_PATH, _schema)
+
+
+def article_key(headline: str, url: str) -> str:
+    """Dedupe key: same headline (case-insensitive) and url."""
+    raw = f"{headline.strip().lower()}\n{url.strip()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def watermarks(tickers) -> dict:
+    """ticker -> unix time of the newest stored headline (tickers never fetched are omitted)."""
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return {}
+    marks = ",".join("?" * len(tickers))
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT ticker, last_ts FROM watermarks WHERE ticker IN ({marks})", tickers).fetchall()
+    return dict(rows)
+
+
+def save(ticker: str, items: list, floor_ts: int) -> int:
+    """
+    Store one ticker's fetched items and advance its watermark (never below floor_ts,
+    the start of the window that was fetched). Returns the number of new headlines.
+    """
+    rows = []
+    for n in items:
+        headline = (n.get("headline") or "").strip()
+        if not headline:
+            continue
+        url = (n.get("url") or "").strip()
+        rows.append((
+            article_key(headline, url), ticker, headline,
+            (n.get("source") or "").strip(), int(n.get("datetime") or 0), url,
+        ))
+    last_ts = max([floor_ts] + [r[4] for r in rows])
+    cutoff = int(time.time()) - RETENTION_DAYS * 86400
+
+    with _write_lock, _connect() as conn:
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?)", rows)
+        added = conn.total_changes - before
+        conn.executemany("INSERT OR IGNORE INTO mentions VALUES (?, ?)", [(r[0], ticker) for r in rows])
+        conn.execute(
+            "INSERT INTO watermarks VALUES (?, ?, ?) ON CONFLICT(ticker) DO UPDATE SET "
+            "last_ts = MAX(last_ts, excluded.last_ts), checked_at = excluded.checked_at",
+            (ticker, last_ts, time.time()),
+        )
+        if conn.execute("DELETE FROM articles WHERE datetime < ?", (cutoff,)).rowcount:
+            conn.execute("DELETE FROM mentions WHERE key NOT IN (SELECT key FROM articles)")
+    return added
+
+
+def query(tickers, since: int, until: int | None = None, per_ticker: int | None = None) -> list:
+    """
+    Stored headlines for these tickers with since <= datetime (< until), most recent first.
+    An article linked to several of the tickers appears once per ticker.
+    Returns list[dict] with keys: headline, source, datetime, url, ticker
+    """
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return []
+    marks = ",".join("?" * len(tickers))
+    sql = (
+        f"SELECT a.headline, a.source, a.datetime, a.url, m.ticker FROM mentions m "
+        f"JOIN articles a ON a.key = m.key WHERE m.ticker IN ({marks}) AND a.datetime >= ?"
+    )
+    params = tickers + [int(since)]
+    if until is not None:
+        sql += " AND a.datetime < ?"
+        params.append(int(until))
+    with _connect() as conn:
+        rows = conn.execute(sql + " ORDER BY a.datetime DESC", params).fetchall()
+
+    news = []
+    counts = {}
+    for headline, source, ts, url, ticker in rows:
+        if per_ticker is not None and counts.get(ticker, 0) >= per_ticker:
+            continue
+        counts[ticker] = counts.get(ticker, 0) + 1
+        news.append({"headline": headline, "source": source, "datetime": ts, "url": url, "ticker": ticker})
+    return news
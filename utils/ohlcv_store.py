@@ -0,0 +1,185 @@
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+from . import circuit, db, perf
+from .paths import data_path
+from .providers import get_provider
+
+# Daily OHLCV bars kept on disk so a refresh only downloads bars newer than
+# the ones already stored (typically 1 per ticker instead of ~250).
+
+DB_PATH = data_path("ohlcv.sqlite")
+HISTORY_DAYS = 366
+
+_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+_write_lock = threading.Lock()
+
+
+def _schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bars (
+            ticker TEXT NOT NULL,
+            date   TEXT NOT NULL,
+            open   REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (ticker, date)
+        )
+        """
+    )
+
+
+def _connect():
+    return db.connect(DB_PATH, _schema)
+
+
+def _clean(tickers):
+    return sorted({str(t).strip() for t in tickers if str(t).strip()})
+
+
+@perf.timed("market.download")
+def download_history(tickers, period="1y", interval="1d", start=None, raise_errors: bool = False):
+    """
+    One batched yfinance download for many tickers.
+    Returns a DataFrame with (field, ticker) MultiIndex columns, or an empty frame
+    (failures too, unless raise_errors=True). Skipped while the Yahoo breaker is open.
+    yfinance reports network errors as an empty frame rather than raising, so a
+    download with no bars for any ticker counts as a Yahoo failure.
+    """
+    tickers = _clean(tickers)
+    if not tickers:
+        return pd.DataFrame()
+
+    yahoo = circuit.get("provider:yahoo")
+    if not yahoo.allow():
+        perf.tag(breaker=yahoo.name)
+        if raise_errors:
+            raise circuit.CircuitOpen(yahoo)
+        return pd.DataFrame()
+
+    try:
+        hist = get_provider().download(
+            tickers,
+            period=None if start else period,
+            start=start,
+            interval=interval,
+        )
+        if hist is None or hist.empty:
+            raise ConnectionError(f"Yahoo returned no bars for any of {len(tickers)} tickers")
+    except Exception as e:
+        perf.tag(error=type(e).__name__)
+        yahoo.failure(e)
+        if raise_errors:
+            raise
+        return pd.DataFrame()
+    yahoo.success()
+
+    # single-ticker downloads may come back with flat columns
+    if not isinstance(hist.columns, pd.MultiIndex):
+        hist.columns = pd.MultiIndex.from_product([hist.columns, tickers])
+    return hist
+
+
+def last_bar_dates(tickers) -> dict:
+    """ticker -> ISO date of the newest stored bar (missing tickers are omitted)."""
+    tickers = _clean(tickers)
+    if not tickers:
+        return {}
+    marks = ",".join("?" * len(tickers))
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT ticker, MAX(date) FROM bars WHERE ticker IN ({marks}) GROUP BY ticker",
+            tickers,
+        ).fetchall()
+    return {t: d for t, d in rows}
+
+
+def _save(hist: pd.DataFrame) -> set:
+    """Store downloaded bars; returns the tickers that had any."""
+    if hist.empty:
+        return set()
+    fields = [f for f in _FIELDS if f in hist.columns.get_level_values(0)]
+    long = hist[fields].stack(level=1, future_stack=True).dropna(subset=["Close"])
+    if long.empty:
+        return set()
+    long = long.reindex(columns=_FIELDS)
+    long.index = long.index.set_names(["date", "ticker"])
+    long = long.reset_index()
+    long["date"] = pd.to_datetime(long["date"]).dt.strftime("%Y-%m-%d")
+
+    rows = long[["ticker", "date"] + _FIELDS].astype(object).where(long.notna(), None).values.tolist()
+    cutoff = (date.today() - timedelta(days=HISTORY_DAYS)).isoformat()
+
+    with _write_lock, _connect() as conn:
+        conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("DELETE FROM bars WHERE date < ?", (cutoff,))
+    return set(long["ticker"])
+
+
+def update(tickers, raise_errors: bool = False):
+    """
+    Bring the store up to date for these tickers.
+    Cold tickers get a full year; warm ones only re-download from their last
+    stored bar (inclusive, so today's partial bar gets replaced).
+    A cold ticker Yahoo has no bars for, while it did return bars for others in
+    the same download, opens its symbol breaker, so it isn't downloaded again
+    until the breaker's cooldown has passed. A download that failed as a whole
+    says nothing about its symbols.
+    With raise_errors=True the first failed download is re-raised once every
+    group has been tried.
+    """
+    tickers = _clean(tickers)
+    marks = last_bar_dates(tickers)
+
+    # cold tickers, then warm ones grouped by their resume date -> usually a single download
+    cold = [t for t in tickers if t not in marks and circuit.get(f"symbol:{t}").allow()]
+    groups = [({"period": "1y"}, cold)]
+    by_start = {}
+    for t, d in marks.items():
+        by_start.setdefault(d, []).append(t)
+    groups += [({"start": start}, group) for start, group in by_start.items()]
+
+    error = None
+    for kwargs, group in groups:
+        if not group:
+            continue
+        try:
+            saved = _save(download_history(group, raise_errors=True, **kwargs))
+        except Exception as e:
+            error = error or e
+            if group is cold:
+                for t in cold:
+                    circuit.get(f"symbol:{t}").release()  # no verdict on these symbols
+            continue
+        if group is cold:
+            for t in cold:
+                breaker = circuit.get(f"symbol:{t}")
+                if t in saved:
+                    breaker.success()
+                elif saved:
+                    breaker.failure("no_data")  # Yahoo answered for the others
+                else:
+                    breaker.release()
+    if error is not None and raise_errors:
+        raise error
+
+
+def load_bars(tickers, days: int = HISTORY_DAYS) -> pd.DataFrame:
+    """Stored bars as a long DataFrame: ticker, date, Open, High, Low, Close, Volume."""
+    tickers = _clean(tickers)
+    if not tickers:
+        return pd.DataFrame(columns=["ticker", "date"] + _FIELDS)
+    cutoff = (date.today() - timedelta(days=days)).isoformat()
+    marks = ",".join("?" * len(tickers))
+    with _connect() as conn:
+        bars = pd.read_sql_query(
+            f"SELECT ticker, date, open, high, low, close, volume FROM bars "
+            f"WHERE ticker IN ({marks}) AND date >= ? ORDER BY ticker, date",
+            conn,
+            params=tickers + [cutoff],
+        )
+    bars.columns = ["ticker", "date"] + _FIELDS
+    bars["date"] = pd.to_datetime(bars["date"])
+    return bars
+
@@ -0,0 +1,11 @@
+import os
+from pathlib import Path
+
+# Local, on-disk state (price store, caches). Override with DASHBOARD_DATA_DIR.
+DATA_DIR = Path(os.environ.get("DASHBOARD_DATA_DIR") or Path(__file__).resolve().parent.parent / ".data")
+
+
+def data_path(name: str) -> Path:
+    """Path of a file inside the data dir (created on first use)."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    return DATA_DIR / name
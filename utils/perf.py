@@ -0,0 +1,188 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from . import circuit
+
+# Lightweight per-rerun instrumentation. Every span records its stage name,
+# duration, outcome and optional tags (cache hit/miss, retries, backoff sleep):
+#
+#     with perf.span("sheets.read") as s:
+#         ...
+#         s["cache"] = "hit"
+#
+#     @perf.timed("market.quote")
+#     def get_quote(...): ...
+#
+# Pages call perf.begin_run() at the top and perf.render_sidebar_panel() at the
+# end. Work done outside a page (scheduler thread, CLI) is recorded under run
+# "background". Set DASHBOARD_PERF_LOG=/path/file.jsonl to append every event.
+
+MAX_EVENTS = 20_000
+
+_events = deque(maxlen=MAX_EVENTS)
+_lock = threading.Lock()
+_run = contextvars.ContextVar("perf_run", default="background")
+_current = contextvars.ContextVar("perf_span", default=None)
+
+
+def begin_run(page: str) -> str:
+    """Start a new run for this script rerun; returns its id."""
+    run_id = f"{page}:{uuid.uuid4().hex[:8]}"
+    _run.set(run_id)
+    st.session_state["perf_run"] = run_id
+    return run_id
+
+
+def current_run() -> str:
+    return _run.get()
+
+
+def propagate(fn):
+    """Bind fn to the caller's run, for work submitted to thread pools."""
+    run_id = _run.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _run.set(run_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _run.reset(token)
+    return wrapper
+
+
+def _record(event: dict):
+    with _lock:
+        _events.append(event)
+    path = os.environ.get("DASHBOARD_PERF_LOG")
+    if path:
+        line = json.dumps(event, default=str)
+        with _lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def span(stage: str, **tags):
+    """Time a block. The yielded dict takes extra tags (cache, retries, sleep_s, ...)."""
+    tags = dict(tags)
+    token = _current.set(tags)
+    started = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield tags
+    except Exception as e:
+        tags.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        record(stage, time.perf_counter() - t0, start=started, **tags)
+
+
+def record(stage: str, duration_s: float, start: float | None = None, **tags):
+    """Record a finished span directly (e.g. for generators, which can't hold a span open)."""
+    _record({
+        "run": _run.get(),
+        "stage": stage,
+        "start": start if start is not None else time.time() - duration_s,
+        "duration_s": duration_s,
+        "thread": threading.current_thread().name,
+        **tags,
+    })
+
+
+def timed(stage: str, cache: bool = False):
+    """
+    Decorator form of span(). With cache=True the call counts as a cache hit
+    unless the wrapped body calls perf.miss() - put it outside st.cache_data.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **({"cache": "hit"} if cache else {})):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def tag(**tags):
+    """Set tags on the innermost open span (no-op outside a span)."""
+    current = _current.get()
+    if current is not None:
+        current.update(tags)
+
+
+def miss():
+    tag(cache="miss")
+
+
+def add(key: str, amount: float = 1):
+    """Accumulate a counter (retries, sleep_s) on the innermost open span."""
+    current = _current.get()
+    if current is not None:
+        current[key] = current.get(key, 0) + amount
+
+
+def events(run_id: str | None = None) -> list:
+    with _lock:
+        return [e for e in _events if run_id is None or e["run"] == run_id]
+
+
+def summary(run_id: str | None = None) -> pd.DataFrame:
+    """Per-stage calls, total / max seconds, retries, backoff sleep, cache hits / misses, errors."""
+    df = pd.DataFrame(events(run_id))
+    columns = ["calls", "total_s", "max_s", "retries", "sleep_s", "hits", "misses", "errors"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    for col in ["retries", "sleep_s", "cache", "error"]:
+        if col not in df.columns:
+            df[col] = None
+    g = df.groupby("stage")
+    out = pd.DataFrame({
+        "calls": g.size(),
+        "total_s": g["duration_s"].sum(),
+        "max_s": g["duration_s"].max(),
+        "retries": g["retries"].sum(min_count=1).fillna(0),
+        "sleep_s": g["sleep_s"].sum(min_count=1).fillna(0.0),
+        "hits": g["cache"].apply(lambda s: (s == "hit").sum()),
+        "misses": g["cache"].apply(lambda s: (s == "miss").sum()),
+        "errors": g["error"].count(),
+    })
+    return out.sort_values("total_s", ascending=False)
+
+
+def to_jsonl(run_id: str | None = None) -> str:
+    return "".join(json.dumps(e, default=str) + "\n" for e in events(run_id))
+
+
+def export_jsonl(path, run_id: str | None = None):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(to_jsonl(run_id))
+
+
+def render_sidebar_panel():
+    """Collapsible breakdown of this rerun's spans (and any tripped circuit breakers), with a JSON-lines download."""
+    run_id = st.session_state.get("perf_run", current_run())
+    with st.sidebar.expander("⏱ Performance", expanded=False):
+        tripped = circuit.status()
+        if tripped:
+            st.caption("Circuit breakers not closed (calls short-circuited while open):")
+            st.dataframe(pd.DataFrame(tripped), use_container_width=True, hide_index=True)
+        table = summary(run_id)
+        if table.empty:
+            st.caption("No instrumented calls in this run.")
+            return
+        st.caption(f"Run {run_id} · {int(table['calls'].sum())} calls")
+        st.dataframe(table.style.format({"total_s": "{:.3f}", "max_s": "{:.3f}", "sleep_s": "{:.1f}"}), use_container_width=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("This run", to_jsonl(run_id), file_name="perf_run.jsonl", mime="application/json")
+        c2.download_button("All runs", to_jsonl(), file_name="perf_all.jsonl", mime="application/json")
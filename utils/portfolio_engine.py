@@ -1,67 +1,147 @@
-import json
+import threading
+import numpy as np
 import pandas as pd
-import gspread
-import streamlit as st
-from oauth2client.service_account import ServiceAccountCredentials
 
-from .market_data import get_stock_price, get_crypto_price
+from . import perf
+from .market_data import SNAPSHOT_COLUMNS, get_crypto_quotes, get_fallback_quotes, get_price_snapshot
+from .providers import get_provider
 
 
-def _get_gsheet_client():
-    """Authorize and return a gspread client using the service account JSON in st.secrets."""
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive",
-    ]
+TEXT_COLUMNS = ["asset_name", "ticker", "category", "thesis", "sector", "country"]
+NUMERIC_COLUMNS = ["units", "avg_price"]
 
-    # service_account_json is stored as a JSON string in secrets
-    sa_json_str = st.secrets["google"]["service_account_json"]
-    sa_info = json.loads(sa_json_str)
+# sheet_id -> (drive modifiedTime, typed DataFrame); shared by every session
+_sheet_cache = {}
+_sheet_lock = threading.Lock()
 
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(sa_info, scope)
-    client = gspread.authorize(creds)
-    return client
 
+def _sheet_revision(sheet_id: str):
+    """Cheap Drive metadata call: the sheet's modifiedTime, or None if unavailable."""
+    try:
+        return get_provider().sheet_revision(sheet_id)
+    except Exception:
+        return None
 
-def read_google_sheet(sheet_id: str) -> pd.DataFrame:
-    """Read the first worksheet from the given Google Sheet ID."""
-    client = _get_gsheet_client()
-    sheet = client.open_by_key(sheet_id).sheet1
-    data = sheet.get_all_records()
-    df = pd.DataFrame(data)
+
+def _type_portfolio(df: pd.DataFrame) -> pd.DataFrame:
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna("").astype(str).str.strip()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype(float)
     return df
 
 
+def read_google_sheet(sheet_id: str) -> pd.DataFrame:
+    """
+    Read the first worksheet from the given Google Sheet ID, with known columns typed.
+    The sheet's Drive modifiedTime is checked first; the full read and parse only
+    happen when the sheet was edited since the last call.
+    """
+    with perf.span("sheets.read") as s:
+        revision = _sheet_revision(sheet_id)
+
+        with _sheet_lock:
+            cached = _sheet_cache.get(sheet_id)
+        if revision is not None and cached is not None and cached[0] == revision:
+            s["cache"] = "hit"
+            return cached[1].copy()
+
+        s["cache"] = "miss"
+        data = get_provider().sheet_records(sheet_id)
+        df = _type_portfolio(pd.DataFrame(data))
+
+        if revision is not None:
+            with _sheet_lock:
+                _sheet_cache[sheet_id] = (revision, df)
+        return df.copy()
+
+
+@perf.timed("portfolio.calculate")
 def calculate_portfolio(df: pd.DataFrame) -> pd.DataFrame:
-    """Add live prices, 52w range, value and P&L to the portfolio DataFrame."""
+    """
+    Enrich the whole portfolio in one pass: live price, previous close, day change,
+    52w range, invested / current value, P&L and portfolio weight per position.
+    Stocks come from one batched price snapshot (fast_info fallback for gaps),
+    crypto from one CoinGecko request. Sheet columns that are absent are added
+    empty and listed in df.attrs["missing_columns"].
+    """
+    df = _type_portfolio(df)
+    missing = [c for c in TEXT_COLUMNS + NUMERIC_COLUMNS if c not in df.columns]
+    for col in missing:
+        df[col] = 0.0 if col in NUMERIC_COLUMNS else ""
+    df.attrs["missing_columns"] = missing
+
+    is_crypto = df["category"].str.lower() == "crypto"
+    tickers = df["ticker"]
+
+    # one batched download for every stock / ETF / index ticker
+    snap = get_price_snapshot(tickers[~is_crypto & (tickers != "")].unique())
+    for col in SNAPSHOT_COLUMNS:
+        df[col] = tickers.map(snap[col])
+    df["quote_error"] = None
+
+    # fast_info fallback for anything the batched download missed (no .info scrape),
+    # fetched concurrently under one shared deadline
+    gaps = get_fallback_quotes(tickers[~is_crypto & (tickers != "") & df["current_price"].isna()].unique())
+    for ticker, q in gaps.items():
+        rows = tickers == ticker
+        if q.ok:
+            df.loc[rows, ["current_price", "52w_high", "52w_low"]] = [q.price, q.high_52, q.low_52]
+        else:
+            df.loc[rows, "quote_error"] = q.error.value
 
-    # make sure numeric
-    df["units"] = pd.to_numeric(df["units"], errors="coerce").fillna(0.0)
-    df["avg_price"] = pd.to_numeric(df["avg_price"], errors="coerce").fillna(0.0)
+    if is_crypto.any():
+        # one CoinGecko request for every coin id
+        crypto_ids = tickers[is_crypto].str.lower()
+        crypto = get_crypto_quotes(crypto_ids.unique())
+        df.loc[is_crypto, "current_price"] = crypto_ids.map(crypto["usd"])
+        df.loc[is_crypto, "day_change_pct"] = crypto_ids.map(crypto["usd_24h_change"])
+        df.loc[is_crypto, ["prev_close", "52w_high", "52w_low"]] = None
 
-    prices = []
-    highs = []
-    lows = []
+    for col in SNAPSHOT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["last_close"] = df["current_price"]
 
-    for _, row in df.iterrows():
-        ticker = row["ticker"]
-        category = str(row["category"]).lower()
+    df["current_value"] = df["current_price"] * df["units"]
+    df["pnl"] = (df["current_price"] - df["avg_price"]) * df["units"]
 
-        if category == "crypto":
-            price = get_crypto_price(ticker)
-            high, low = None, None
-        else:
-            price, high, low = get_stock_price(ticker)
+    df["position_invested"] = df["units"] * df["avg_price"]
+    df["position_value"] = df["current_value"].fillna(0.0)
+    df["pnl_absolute"] = df["position_value"] - df["position_invested"]
+    df["pnl_pct"] = (df["pnl_absolute"] / df["position_invested"].where(df["position_invested"] > 0)) * 100
+    return _with_weights(df)
 
-        prices.append(price)
-        highs.append(high)
-        lows.append(low)
 
-    df["current_price"] = prices
-    df["52w_high"] = highs
-    df["52w_low"] = lows
+# country codes as they appear in the sheet -> market
+COUNTRY_ALIASES = {"US": ["US", "USA"], "IND": ["IND", "IN", "INDIA"]}
 
-    df["current_value"] = df["current_price"] * df["units"]
-    df["pnl"] = (df["current_price"] - df["avg_price"]) * df["units"]
 
+def _with_weights(df: pd.DataFrame) -> pd.DataFrame:
+    if "position_value" in df.columns:
+        total = float(df["position_value"].sum())
+        df["weight_pct"] = df["position_value"] / total * 100 if total > 0 else np.nan
     return df
+
+
+def portfolio_view(df: pd.DataFrame, country: str | None = None, category: str | None = None,
+                   sector: str | None = None) -> pd.DataFrame:
+    """
+    Rows of the (enriched) portfolio for one country / category / sector (case-insensitive;
+    country also accepts COUNTRY_ALIASES), sorted by position value, with weight_pct
+    recomputed within the view. Rows without a ticker are dropped.
+    """
+    mask = df["ticker"] != ""
+    if country is not None:
+        codes = COUNTRY_ALIASES.get(country.upper(), [country.upper()])
+        mask &= df["country"].str.upper().isin(codes)
+    if category is not None:
+        mask &= df["category"].str.lower() == category.lower()
+    if sector is not None:
+        mask &= df["sector"].str.lower() == sector.lower()
+
+    view = _with_weights(df[mask].copy())
+    if "position_value" in view.columns:
+        view = view.sort_values("position_value", ascending=False)
+    return view
@@ -0,0 +1,393 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import gspread
+import requests
+import streamlit as st
+import yfinance as yf
+from oauth2client.service_account import ServiceAccountCredentials
+from openai import OpenAI
+from requests.adapters import HTTPAdapter
+
+from .paths import data_path
+
+# Every vendor call (yfinance, Finnhub, CoinGecko, OpenAI, Google Sheets,
+# OpenWeather, Unsplash) goes through a provider so the dashboard can run
+# against live services, record their responses to fixture files, or replay
+# those fixtures offline:
+#
+#     DASHBOARD_PROVIDER=live|record|replay
+#     DASHBOARD_FIXTURES=/path/to/fixtures      (default: .data/fixtures)
+#     DASHBOARD_REPLAY_LATENCY=0.25             (seconds per replayed call)
+
+
+HTTP_TIMEOUT = 10  # seconds per vendor request (connect + read)
+
+
+class FixtureMissing(LookupError):
+    pass
+
+
+class DataProvider:
+    """Interface. Results must be picklable so they can be recorded."""
+
+    def download(self, tickers: list, period=None, start=None, interval="1d"):
+        """Batched daily bars (yf.download frame, (field, ticker) columns)."""
+        raise NotImplementedError
+
+    def fast_info(self, ticker: str) -> dict:
+        """lastPrice / yearHigh / yearLow / previousClose."""
+        raise NotImplementedError
+
+    def info(self, ticker: str) -> dict:
+        raise NotImplementedError
+
+    def company_news(self, ticker: str, date_from: str, date_to: str, api_key: str) -> list:
+        raise NotImplementedError
+
+    def crypto_prices(self, params: dict) -> dict:
+        """CoinGecko /simple/price response."""
+        raise NotImplementedError
+
+    def chat(self, api_key: str, model: str, messages: list, **options) -> str:
+        """Chat completion text. Live providers raise openai errors (e.g. RateLimitError)."""
+        raise NotImplementedError
+
+    def chat_stream(self, api_key: str, model: str, messages: list, **options):
+        """Chat completion as an iterator of text deltas (default: the whole text at once)."""
+        yield self.chat(api_key, model, messages, **options)
+
+    def sheet_records(self, sheet_id: str) -> list:
+        """Rows of the sheet's first worksheet as dicts (gspread get_all_records)."""
+        raise NotImplementedError
+
+    def sheet_revision(self, sheet_id: str):
+        """The sheet's Drive modifiedTime (changes on every edit)."""
+        raise NotImplementedError
+
+    def weather(self, city_id: str, api_key: str) -> dict:
+        """OpenWeather /weather response for a city id, metric units."""
+        raise NotImplementedError
+
+    def unsplash_image(self, api_key: str, collection_id: str) -> dict:
+        """Unsplash /photos/random response (landscape, from one collection)."""
+        raise NotImplementedError
+
+
+class _GSheetClientManager:
+    """
+    Process-wide gspread client shared by every page and session.
+    Credentials are built once, the access token is refreshed only near expiry,
+    and all Sheets / Drive calls reuse one pooled HTTP session.
+    """
+
+    SCOPE = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    REFRESH_MARGIN = timedelta(minutes=5)
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._build()
+            elif self._expiring():
+                self._client.http_client.login()
+            return self._client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+
+    def _build(self):
+        # service_account_json is stored as a JSON string in secrets
+        sa_json_str = st.secrets["google"]["service_account_json"]
+        sa_info = json.loads(sa_json_str)
+
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(sa_info, self.SCOPE)
+        client = gspread.authorize(creds)
+        client.http_client.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        client.http_client.login()
+        return client
+
+    def _expiring(self) -> bool:
+        expiry = self._client.expiry  # naive UTC, as google-auth stores it
+        return expiry is None or expiry - datetime.utcnow() < self.REFRESH_MARGIN
+
+
+class LiveProvider(DataProvider):
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        self.sheets = _GSheetClientManager()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        return yf.download(
+            tickers,
+            period=None if start else period,
+            start=start,
+            interval=interval,
+            group_by="column",
+            progress=False,
+            threads=True,
+            timeout=HTTP_TIMEOUT,
+        )
+
+    def fast_info(self, ticker):
+        fi = yf.Ticker(ticker).fast_info
+        return {k: fi[k] for k in ["lastPrice", "yearHigh", "yearLow", "previousClose"]}
+
+    def info(self, ticker):
+        return dict(yf.Ticker(ticker).info or {})
+
+    def company_news(self, ticker, date_from, date_to, api_key):
+        r = self.session.get(
+            "https://finnhub.io/api/v1/company-news",
+            params={"symbol": ticker, "from": date_from, "to": date_to, "token": api_key},
+            timeout=HTTP_TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def crypto_prices(self, params):
+        r = self.session.get("https://api.coingecko.com/api/v3/simple/price", params=params, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+    def openai_client(self, api_key: str, max_retries: int = 2):
+        with self._lock:
+            key = (api_key, max_retries)
+            if key not in self._clients:
+                self._clients[key] = OpenAI(api_key=api_key, max_retries=max_retries)
+            return self._clients[key]
+
+    def chat(self, api_key, model, messages, max_retries=2, **options):
+        resp = self.openai_client(api_key, max_retries).chat.completions.create(
+            model=model, messages=messages, **options
+        )
+        return resp.choices[0].message.content
+
+    def chat_stream(self, api_key, model, messages, max_retries=2, **options):
+        stream = self.openai_client(api_key, max_retries).chat.completions.create(
+            model=model, messages=messages, stream=True, **options
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def sheet_records(self, sheet_id):
+        return self.sheets.get().open_by_key(sheet_id).sheet1.get_all_records()
+
+    def sheet_revision(self, sheet_id):
+        return self.sheets.get().http_client.get_file_drive_metadata(sheet_id).get("modifiedTime")
+
+    def weather(self, city_id, api_key):
+        r = self.session.get(
+            "https://api.openweathermap.org/data/2.5/weather",
+            params={"id": city_id, "appid": api_key, "units": "metric"},
+            timeout=HTTP_TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def unsplash_image(self, api_key, collection_id):
+        r = self.session.get(
+            "https://api.unsplash.com/photos/random",
+            params={
+                "collections": collection_id,
+                "orientation": "landscape",
+                "content_filter": "high",
+                "client_id": api_key,
+            },
+            timeout=HTTP_TIMEOUT,
+        )
+        r.raise_for_status()
+        return r.json()
+
+
+# args that change from run to run (dates, incremental start) - a replay falls
+# back to a fixture recorded with different values for them
+LOOSE_ARGS = {
+    "download": ("period", "start"),
+    "company_news": ("date_from", "date_to"),
+}
+
+
+def _fixture_key(method: str, args: dict) -> str:
+    # credentials are never part of a fixture key (or file)
+    args = {k: v for k, v in args.items() if k not in ("api_key", "max_retries")}
+    raw = json.dumps([method, args], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class _FixtureFiles:
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def paths(self, method, args):
+        """Exact fixture path, then the loose one (LOOSE_ARGS dropped) if the method has any."""
+        exact = self.root / method / f"{_fixture_key(method, args)}.pkl"
+        loose_args = {k: v for k, v in args.items() if k not in LOOSE_ARGS.get(method, ())}
+        if loose_args == args:
+            return [exact]
+        return [exact, self.root / method / "loose" / f"{_fixture_key(method, loose_args)}.pkl"]
+
+    def save(self, method, args, value):
+        for path in self.paths(method, args):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp, path)
+
+    def load(self, method, args):
+        for path in self.paths(method, args):
+            if path.exists():
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+        raise FixtureMissing(f"no {method} fixture for {args}")
+
+
+class RecordingProvider(DataProvider):
+    """Wraps another provider and saves every successful response as a fixture."""
+
+    def __init__(self, inner: DataProvider, fixture_dir):
+        self.inner = inner
+        self.files = _FixtureFiles(fixture_dir)
+
+    def _record(self, method, args):
+        value = getattr(self.inner, method)(**args)
+        self.files.save(method, args, value)
+        return value
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        return self._record("download", dict(tickers=list(tickers), period=period, start=start, interval=interval))
+
+    def fast_info(self, ticker):
+        return self._record("fast_info", dict(ticker=ticker))
+
+    def info(self, ticker):
+        return self._record("info", dict(ticker=ticker))
+
+    def company_news(self, ticker, date_from, date_to, api_key):
+        return self._record("company_news", dict(ticker=ticker, date_from=date_from, date_to=date_to, api_key=api_key))
+
+    def crypto_prices(self, params):
+        return self._record("crypto_prices", dict(params=params))
+
+    def chat(self, api_key, model, messages, **options):
+        return self._record("chat", dict(api_key=api_key, model=model, messages=messages, **options))
+
+    def chat_stream(self, api_key, model, messages, **options):
+        # pass deltas through as they arrive; the fixture is written once the stream completes
+        args = dict(api_key=api_key, model=model, messages=messages, **options)
+        chunks = []
+        for delta in self.inner.chat_stream(**args):
+            chunks.append(delta)
+            yield delta
+        self.files.save("chat_stream", args, chunks)
+
+    def sheet_records(self, sheet_id):
+        return self._record("sheet_records", dict(sheet_id=sheet_id))
+
+    def sheet_revision(self, sheet_id):
+        return self._record("sheet_revision", dict(sheet_id=sheet_id))
+
+    def weather(self, city_id, api_key):
+        return self._record("weather", dict(city_id=city_id, api_key=api_key))
+
+    def unsplash_image(self, api_key, collection_id):
+        return self._record("unsplash_image", dict(api_key=api_key, collection_id=collection_id))
+
+
+class ReplayProvider(DataProvider):
+    """
+    Serves recorded fixtures with artificial latency (seconds, or {method: seconds})
+    and optional +/- jitter fraction. Missing fixtures raise FixtureMissing.
+    """
+
+    def __init__(self, fixture_dir, latency=0.0, jitter: float = 0.0):
+        self.files = _FixtureFiles(fixture_dir)
+        self.latency = latency
+        self.jitter = jitter
+
+    def _replay(self, method, args):
+        delay = self.latency.get(method, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter))))
+        return self.files.load(method, args)
+
+    def download(self, tickers, period=None, start=None, interval="1d"):
+        return self._replay("download", dict(tickers=list(tickers), period=period, start=start, interval=interval))
+
+    def fast_info(self, ticker):
+        return self._replay("fast_info", dict(ticker=ticker))
+
+    def info(self, ticker):
+        return self._replay("info", dict(ticker=ticker))
+
+    def company_news(self, ticker, date_from, date_to, api_key):
+        return self._replay("company_news", dict(ticker=ticker, date_from=date_from, date_to=date_to, api_key=api_key))
+
+    def crypto_prices(self, params):
+        return self._replay("crypto_prices", dict(params=params))
+
+    def chat(self, api_key, model, messages, **options):
+        return self._replay("chat", dict(api_key=api_key, model=model, messages=messages, **options))
+
+    def chat_stream(self, api_key, model, messages, **options):
+        yield from self._replay("chat_stream", dict(api_key=api_key, model=model, messages=messages, **options))
+
+    def sheet_records(self, sheet_id):
+        return self._replay("sheet_records", dict(sheet_id=sheet_id))
+
+    def sheet_revision(self, sheet_id):
+        return self._replay("sheet_revision", dict(sheet_id=sheet_id))
+
+    def weather(self, city_id, api_key):
+        return self._replay("weather", dict(city_id=city_id, api_key=api_key))
+
+    def unsplash_image(self, api_key, collection_id):
+        return self._replay("unsplash_image", dict(api_key=api_key, collection_id=collection_id))
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def _from_env() -> DataProvider:
+    mode = os.environ.get("DASHBOARD_PROVIDER", "live").lower()
+    fixtures = os.environ.get("DASHBOARD_FIXTURES") or data_path("fixtures")
+    if mode == "record":
+        return RecordingProvider(LiveProvider(), fixtures)
+    if mode == "replay":
+        return ReplayProvider(fixtures, latency=float(os.environ.get("DASHBOARD_REPLAY_LATENCY", "0") or 0))
+    return LiveProvider()
+
+
+def get_provider() -> DataProvider:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = _from_env()
+        return _provider
+
+
+def set_provider(provider: DataProvider):
+    """Swap the backend for the whole process (e.g. benchmarks, offline runs)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    `rate` tokens are added per second up to `capacity`; acquire() blocks until enough are available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, n: float, burst: float | None = None):
+        return cls(rate=n / 60.0, capacity=burst if burst is not None else n)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        # never wait for more than a full bucket (oversized requests drain it instead)
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket (e.g. after the server says we are over quota)."""
+        with self._lock:
+            self._refill()
+            self._tokens = 0.0
@@ -0,0 +1,179 @@
+import threading
+import time
+
+import streamlit as st
+
+from . import snapshot_store, swr
+from .macro_engine import base_symbols, build_snapshot, get_macro_snapshot
+from .market_data import get_price_snapshot
+from .news_engine import DEFAULT_WINDOW_DAYS, fetch_portfolio_news, ingest_news, load_news
+from .portfolio_engine import calculate_portfolio, read_google_sheet
+
+# Background refresher: keeps portfolio, enriched portfolio (the "prices" job),
+# macro and news snapshots warm in snapshot_store so pages only read
+# precomputed data. Runs as a daemon thread inside the Streamlit server
+# (start_scheduler) or as a separate worker:
+#
+#     python -m utils.scheduler
+#
+# Intervals (seconds) can be overridden in secrets:
+#
+#     [scheduler]
+#     in_process = true
+#     portfolio_interval = 300
+#     prices_interval = 900
+
+DEFAULT_INTERVALS = {"portfolio": 300, "prices": 900, "macro": 900, "news": 1200}
+
+
+def _config() -> dict:
+    try:
+        return dict(st.secrets.get("scheduler", {}))
+    except Exception:
+        return {}
+
+
+def intervals() -> dict:
+    cfg = _config()
+    return {name: float(cfg.get(f"{name}_interval", sec)) for name, sec in DEFAULT_INTERVALS.items()}
+
+
+def _max_age(name: str) -> float:
+    # tolerate one missed cycle before falling back to a live fetch
+    return 2 * intervals()[name]
+
+
+def _tickers(df) -> tuple:
+    """Every ticker in the portfolio sheet, sorted."""
+    return tuple(sorted(df.loc[df["ticker"] != "", "ticker"].unique()))
+
+
+# ---------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------
+def refresh_portfolio():
+    sheet_id = st.secrets["google"]["sheet_id"]
+    df = read_google_sheet(sheet_id)
+    previous = snapshot_store.get("portfolio")
+    snapshot_store.put("portfolio", {"sheet_id": sheet_id, "df": df})
+    if previous is not None and (previous["sheet_id"] != sheet_id or not previous["df"].equals(df)):
+        # holdings changed: re-enrich now rather than at the next prices cycle
+        refresh_prices()
+
+
+def refresh_prices():
+    portfolio = snapshot_store.get("portfolio")
+    if portfolio is None:
+        return
+    enriched = calculate_portfolio(portfolio["df"].copy())
+    snapshot_store.put("enriched", {"sheet_id": portfolio["sheet_id"], "df": enriched})
+
+
+def refresh_macro():
+    snapshot_store.put("macro", build_snapshot(get_price_snapshot(base_symbols())))
+
+
+def refresh_news():
+    portfolio = snapshot_store.get("portfolio")
+    if portfolio is None:
+        return
+    tickers = _tickers(portfolio["df"])
+    # headlines go to news_store; the snapshot only records which tickers are current
+    snapshot_store.put("news", {"tickers": tickers, "added": ingest_news(tickers)})
+
+
+# run order matters: prices and news are derived from the portfolio snapshot
+JOBS = {
+    "portfolio": refresh_portfolio,
+    "prices": refresh_prices,
+    "macro": refresh_macro,
+    "news": refresh_news,
+}
+
+
+class RefreshScheduler(threading.Thread):
+    """Runs every job in JOBS on its own interval until stop() is called."""
+
+    def __init__(self, job_intervals: dict):
+        super().__init__(name="refresh-scheduler", daemon=True)
+        self.intervals = job_intervals
+        self.next_run = {name: 0.0 for name in JOBS}
+        self.last_error = {}
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_due(self):
+        for name, job in JOBS.items():
+            if time.monotonic() < self.next_run[name]:
+                continue
+            try:
+                job()
+                self.last_error.pop(name, None)
+            except Exception as e:
+                print("SCHEDULER ERROR:", name, e)
+                self.last_error[name] = str(e)
+            self.next_run[name] = time.monotonic() + self.intervals[name]
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_due()
+            wait = min(self.next_run.values()) - time.monotonic()
+            self._stop_event.wait(max(1.0, min(wait, 30.0)))
+
+
+@st.cache_resource(show_spinner=False)
+def start_scheduler():
+    """Start the in-process refresher once per server (no-op when in_process = false)."""
+    if not _config().get("in_process", True):
+        return None
+    scheduler = RefreshScheduler(intervals())
+    scheduler.start()
+    return scheduler
+
+
+# ---------------------------------------------------------
+# Readers (precomputed snapshot, or a live fetch when missing / stale)
+# ---------------------------------------------------------
+def precomputed_portfolio(sheet_id: str):
+    portfolio = snapshot_store.get("portfolio", max_age=_max_age("portfolio"))
+    if portfolio is not None and portfolio["sheet_id"] == sheet_id:
+        return portfolio["df"].copy()
+    return read_google_sheet(sheet_id)
+
+
+@swr.cached("portfolio.enriched", ttl=DEFAULT_INTERVALS["prices"], deadline=20.0)
+def _enriched_live(sheet_id: str):
+    return calculate_portfolio(precomputed_portfolio(sheet_id))
+
+
+def precomputed_enriched(sheet_id: str):
+    """
+    The whole portfolio with prices, P&L and weights (portfolio_engine.calculate_portfolio),
+    computed once per refresh cycle and shared by every page and session.
+    Filter it with portfolio_engine.portfolio_view().
+    """
+    enriched = snapshot_store.get("enriched", max_age=_max_age("prices"))
+    if enriched is not None and enriched["sheet_id"] == sheet_id:
+        return enriched["df"].copy()
+    return _enriched_live(sheet_id).copy()
+
+
+def precomputed_macro() -> dict:
+    snap = snapshot_store.get("macro", max_age=_max_age("macro"))
+    if snap is not None:
+        return snap
+    return get_macro_snapshot()
+
+
+def precomputed_news(tickers, days: float = DEFAULT_WINDOW_DAYS):
+    tickers = set(tickers)
+    news = snapshot_store.get("news", max_age=_max_age("news"))
+    if news is not None and tickers <= set(news["tickers"]):
+        return load_news(tickers, days)
+    return fetch_portfolio_news(tuple(sorted(tickers)), days=days)
+
+
+if __name__ == "__main__":
+    RefreshScheduler(intervals()).run()
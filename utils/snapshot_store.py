@@ -0,0 +1,67 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from .paths import data_path
+
+# Precomputed snapshots (portfolio, enriched, macro, news) shared between the
+# background refresher and the pages. Values live in memory and are mirrored
+# to disk, so a separate worker process can write them too.
+
+SNAPSHOT_DIR = data_path("snapshots")
+SNAPSHOT_DIR.mkdir(exist_ok=True)
+
+_memory = {}  # name -> (mtime, written_at, value)
+_lock = threading.Lock()
+
+
+def _path(name: str):
+    return SNAPSHOT_DIR / f"{name}.pkl"
+
+
+def put(name: str, value):
+    written_at = time.time()
+    fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=f".{name}.")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump((written_at, value), f)
+    os.replace(tmp, _path(name))  # atomic: readers never see a partial file
+    with _lock:
+        _memory[name] = (os.path.getmtime(_path(name)), written_at, value)
+
+
+def _load(name: str):
+    path = _path(name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _memory.get(name)
+    if cached is not None and cached[0] == mtime:
+        return cached
+    try:
+        with open(path, "rb") as f:
+            written_at, value = pickle.load(f)
+    except Exception:
+        return None
+    with _lock:
+        _memory[name] = (mtime, written_at, value)
+    return _memory[name]
+
+
+def get(name: str, max_age: float | None = None):
+    """Stored value, or None when missing or older than max_age seconds."""
+    entry = _load(name)
+    if entry is None:
+        return None
+    if max_age is not None and time.time() - entry[1] > max_age:
+        return None
+    return entry[2]
+
+
+def age(name: str):
+    """Seconds since the snapshot was written, or None when missing."""
+    entry = _load(name)
+    return None if entry is None else time.time() - entry[1]
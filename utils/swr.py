@@ -0,0 +1,171 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import streamlit as st
+
+from . import perf
+
+# Stale-while-revalidate cache for calls to slow or flaky upstreams (Yahoo,
+# CoinGecko, OpenWeather, Unsplash):
+#
+#     @swr.cached("home.weather", ttl=1800, deadline=4.0, fallback=(None, None, None))
+#     def get_weather(city_id, api_key): ...     # raise on failure
+#
+# - fresh value: returned as is
+# - expired value: returned at once; one background refresh replaces it
+# - no value yet: the caller waits at most `deadline` seconds, then gets
+#   `fallback` (or the error); the fetch keeps running and fills the cache
+#
+# A failed or overdue refresh keeps the last good value, which is then reported
+# as stale for this run (see stale() / render_stale_notice()). Arguments are the
+# cache key, so they must be hashable. `ttl` may also be a function of the same
+# arguments, evaluated when a value is stored (e.g. market_hours.cache_ttl).
+
+RETRY_AFTER = 15      # seconds before a failed fetch is tried again
+STUCK_AFTER = 120     # a refresh running longer than this is abandoned and restarted
+MAX_RUNS = 200        # runs whose stale report is kept
+
+_RAISE = object()
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="swr")
+_lock = threading.Lock()
+_entries = {}                # (name, key) -> _Entry
+_stale_runs = OrderedDict()  # run id -> {name: {"age_s": ..., "error": ...}}
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "expires_at", "error", "failed_at", "future", "started_at")
+
+    def __init__(self):
+        self.value = None
+        self.fetched_at = None   # monotonic time of the last good value
+        self.expires_at = None
+        self.error = None        # last refresh error (cleared by a success)
+        self.failed_at = None
+        self.future = None       # refresh in flight
+        self.started_at = None
+
+
+def _refresh(name: str, entry: _Entry, fetch, ttl):
+    with perf.span(f"{name}.refresh") as s:
+        try:
+            value = fetch()
+            s["ttl_s"] = ttl = ttl() if callable(ttl) else ttl
+        except Exception as e:
+            with _lock:
+                entry.error = type(e).__name__
+                entry.failed_at = time.monotonic()
+                entry.future = None
+            raise
+    with _lock:
+        entry.value = value
+        entry.fetched_at = time.monotonic()
+        entry.expires_at = entry.fetched_at + ttl
+        entry.error = None
+        entry.future = None
+    return value
+
+
+def _mark_stale(name: str, entry: _Entry, reason: str):
+    info = {"age_s": time.monotonic() - entry.fetched_at if entry.fetched_at is not None else None, "error": reason}
+    run_id = perf.current_run()
+    with _lock:
+        report = _stale_runs.setdefault(run_id, {})
+        _stale_runs.move_to_end(run_id)
+        while len(_stale_runs) > MAX_RUNS:
+            _stale_runs.popitem(last=False)
+        if name not in report or (info["age_s"] or 0) > (report[name]["age_s"] or 0):
+            report[name] = info
+    perf.tag(stale=True)
+
+
+def get(name: str, key, fetch, ttl, deadline: float, fallback=_RAISE):
+    """
+    Cached value of fetch() under (name, key); see the module comment.
+    ttl: seconds, or a no-argument function returning them once fetch() succeeded.
+    Without a fallback, a first fetch that fails or misses its deadline raises
+    (TimeoutError for the deadline).
+    """
+    with perf.span(name) as s:
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.setdefault((name, key), _Entry())
+            has_value = entry.fetched_at is not None
+            fresh = has_value and now < entry.expires_at
+            stuck = entry.future is not None and now - entry.started_at > STUCK_AFTER
+            backing_off = entry.failed_at is not None and now - entry.failed_at < RETRY_AFTER
+            if not fresh and (entry.future is None or stuck) and not backing_off:
+                entry.started_at = now
+                entry.future = _pool.submit(perf.propagate(_refresh), name, entry, fetch, ttl)
+            value, future, error = entry.value, entry.future, entry.error
+            overdue = future is not None and now - entry.started_at > deadline
+
+        if fresh:
+            s["cache"] = "hit"
+            return value
+        if has_value:
+            s["cache"] = "hit"
+            if error or overdue:
+                _mark_stale(name, entry, error or "refresh overdue")
+            return value
+
+        s["cache"] = "miss"
+        try:
+            if future is None:
+                raise RuntimeError(f"{name}: last fetch failed ({error})")
+            return future.result(timeout=max(0.0, deadline - (time.monotonic() - entry.started_at)))
+        except Exception as e:
+            s["error"] = "deadline" if isinstance(e, TimeoutError) else type(e).__name__
+            if fallback is _RAISE:
+                if isinstance(e, TimeoutError):
+                    raise TimeoutError(f"{name}: no value within {deadline:.1f}s") from None
+                raise
+            _mark_stale(name, entry, s["error"])
+            return fallback
+
+
+def cached(name: str, ttl, deadline: float, fallback=_RAISE):
+    """Decorator form of get(), keyed by the call's arguments (ttl: seconds or ttl(*args, **kwargs))."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            call_ttl = functools.partial(ttl, *args, **kwargs) if callable(ttl) else ttl
+            return get(name, key, functools.partial(fn, *args, **kwargs), call_ttl, deadline, fallback)
+        return wrapper
+    return decorator
+
+
+def stale(run_id: str | None = None) -> dict:
+    """{name: {"age_s", "error"}} for values served stale (or as fallbacks) in this run."""
+    run_id = run_id or perf.current_run()
+    with _lock:
+        return dict(_stale_runs.get(run_id, {}))
+
+
+def clear():
+    """Forget every cached value (refreshes already running still finish)."""
+    with _lock:
+        _entries.clear()
+        _stale_runs.clear()
+
+
+def _age(seconds) -> str:
+    if seconds is None:
+        return "unavailable"
+    if seconds < 90:
+        return f"{seconds:.0f}s old"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f} min old"
+    return f"{seconds / 3600:.1f} h old"
+
+
+def render_stale_notice():
+    """One caption listing the sources shown from cache because their refresh failed."""
+    report = stale(st.session_state.get("perf_run", perf.current_run()))
+    if report:
+        parts = [f"{name} ({_age(info['age_s'])}, {info['error']})" for name, info in sorted(report.items())]
+        st.caption("⚠️ Showing last known data for: " + "; ".join(parts))